@@ -1,18 +1,39 @@
-import io
-import pandas as pd
-import numpy as np
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import matplotlib.colors as colors
+import hashlib
+from concurrent.futures import as_completed
 import streamlit as st
-from shapely.geometry import box
-from PIL import Image
+import streamlit.components.v1 as components
 
 from src.utils.passcheck import check_password
-from src.utils.data_adds import variable_labels, bbox_coords
+from src.utils.startup import (
+    PREWARM, prewarm, import_modules, startup_report, shared_master_data, shared_states_data
+)
+
+# The login page only needs Streamlit. The data stack is imported (and the data loaded)
+# in the background while it is shown, see src/utils/startup.py
+if PREWARM:
+    prewarm()
 
 if check_password():
 
+    import_modules()
+    import pandas as pd
+
+    from src.utils.data_adds import variable_labels, wjp_regions
+    from src.utils.geometry import WORLD_BOUNDS, region_bounds, extension_key
+    from src.utils.caching import LRUCache, content_key
+    from src.utils.exporting import MIME_TYPES
+    from src.utils.custom_data import (
+        CUSTOM_FORMATS, check_upload_size, upload_format, custom_variables, read_custom_data, 
+        match_codes
+    )
+    from src.utils.rendering import (
+        world_boundaries, delta_bin_labels, render_outputs, render_year_grid
+    )
+    from src.utils.batch_render import render_pool, render_request
+    from src.utils.profiling import StageTimer
+    from src.utils.tiles import load_tile_manifest, build_tiles
+    from src.utils.web_map import WEB_MAP_HEIGHT, web_map_data, web_map_html
+
     st.set_page_config(
         page_title = "Map Generator",
         page_icon  = ":earth_americas:"
@@ -22,17 +43,73 @@ if check_password():
         st.markdown(f"<style>{stl.read()}</style>", 
                     unsafe_allow_html=True)
 
-    @st.cache_data
-    def load_data():
-        boundaries        = gpd.read_file("Data/data4app.geojson")
-        roli_data         = pd.read_excel("Data/ROLI_data.xlsx")
-        roli_data["year"] = roli_data["year"].apply(str)
-        data              = {
-            "boundaries" : boundaries,
-            "roli"       : roli_data
-        }
-        return data 
-    master_data = load_data()
+    # Shared, read-only master data and Mexican states layer (see src/utils/startup.py)
+    master_data = shared_master_data()
+    states_data = shared_states_data()
+
+    # Clipped and projected boundaries (and the renderers drawing them) only depend on
+    # the map extension, so they are shared across sessions and reused when only the
+    # scores or the colors change
+    @st.cache_resource
+    def geometry_cache():
+        return LRUCache(
+            max_entries = 32,
+            max_bytes   = 256 * 1024**2
+        )
+
+    # Worker processes with the data preloaded, used to draw several maps at once
+    @st.cache_resource
+    def worker_pool():
+        return render_pool()
+
+    # Finished outputs (map, table and chart bytes) keyed by a hash of the request
+    @st.cache_resource
+    def render_cache():
+        return LRUCache(
+            max_entries = 64,
+            max_bytes   = 512 * 1024**2
+        )
+
+    # Uploaded datasets only belong to the session that uploaded them. They are parsed
+    # once per file and variable (keyed by the file checksum) into a cache of the
+    # session, bounded in size, and dropped as soon as the upload is removed
+    PREVIEW_ROWS = 1000
+
+    def session_uploads():
+        if "uploads" not in st.session_state:
+            st.session_state["uploads"] = LRUCache(
+                max_entries = 4,
+                max_bytes   = 128 * 1024**2
+            )
+        return st.session_state["uploads"]
+
+    # Tiles of the interactive map. When they were not built offline (see tiles.py), or
+    # were built from other boundaries, they are built once from the loaded boundaries
+    # and served locally all the same
+    @st.cache_resource
+    def tile_manifest():
+        return (
+            load_tile_manifest(data_dir = master_data["data_dir"])
+            or build_tiles(world_boundaries(master_data), master_data["lod_levels"],
+                           master_data["data_dir"])
+        )
+
+    # Wall time (and peak memory) of every stage of the last render, which is also
+    # written as a JSON line and a cProfile dump when enabled (see profiling.py)
+    def timing_breakdown(timer, cached):
+        with st.expander("Timing breakdown"):
+            if cached:
+                st.caption("Served from the render cache.")
+                return
+            st.dataframe(
+                pd.DataFrame(timer.table()).set_index("stage"),
+                column_config = {
+                    "seconds" : st.column_config.NumberColumn("Seconds", format = "%.3f"),
+                    "peak_mb" : st.column_config.NumberColumn("Peak memory (MB)", format = "%.1f"),
+                    "share"   : st.column_config.ProgressColumn("Share", min_value = 0, max_value = 1)
+                }
+            )
+            st.caption(f"Total: {timer.total:.2f} s")
     
 
     st.title("ROLI Map Generator")
@@ -75,6 +152,8 @@ if check_password():
             It can be a world or regional map. For regional maps, you can select from
             a predefined list of options or you can customize the extension using 
             geographical coordinates in order to define a bounding box for your map.
+            You can also draw a map of the Mexican states with the scores of the
+            Mexico States Rule of Law Index.
             </p>
             """,
             unsafe_allow_html = True
@@ -95,20 +174,12 @@ if check_password():
 
         extension = st.radio(
             "Select an extension for your map:", 
-            ["World", "Regional", "Custom"],
+            ["World", "Regional", "Custom"] + (["Mexican states"] if states_data else []),
             horizontal = True
         )
 
         UN_regions    = ["Asia", "Americas", "Africa", "Europe", "Oceania"]
-        WJP_regions   = [
-            "East Asia and Pacific",
-            "Eastern Europe and Central Asia",
-            "EU, EFTA, and North America",
-            "Latin America and Caribbean",
-            "Middle East and North Africa",
-            "South Asia",
-            "Sub-Saharan Africa"
-        ]
+        WJP_regions   = wjp_regions
 
         if extension == "Regional":
             
@@ -215,6 +286,7 @@ if check_password():
                 value = True,
                 help  = "Countries within the map that are not part of the target region will have an alpha value of 20%"
             )
+            highlighted_countries = None
             if opac:
                 countries4high = st.multiselect(
                     "Select the countries you would like to highlight:",  
@@ -230,9 +302,14 @@ if check_password():
                 )
         
         else:
-            selected_regions = None
-            regfilter        = None
-            opac             = False
+            selected_regions      = None
+            regfilter             = None
+            opac                  = False
+            highlighted_countries = None
+
+            # State maps use the states layer in place of the countries for this run
+            if extension == "Mexican states":
+                master_data = states_data
 
     st.markdown("""---""")
 
@@ -257,7 +334,10 @@ if check_password():
         
         data_input = st.radio(
             "Select a data input for your map:", 
-            ["Rule of Law Index", "Custom Data"],
+            [
+                "Mexico States Rule of Law Index" if extension == "Mexican states" else "Rule of Law Index", 
+                "Custom Data"
+            ],
             horizontal = True
         )
         
@@ -265,49 +345,65 @@ if check_password():
 
             delta_bin = False
 
-            cdata_example = Image.open("Media/custom_data_example.png")
             with st.expander(
                 label = "Please click here to see an example of how to structure the custom data."
             ) :
-                st.image(cdata_example)
+                st.image("Media/custom_data_example.png")
 
             uploaded_file = st.file_uploader(
-                "Upload Excel file", 
-                type = ["xlsx"]
+                "Upload a data file (Excel, CSV or Parquet)", 
+                type = CUSTOM_FORMATS
             )
+            custom_ready = False
+            if uploaded_file is None:
+                session_uploads().clear()
             
             if uploaded_file is not None:
                 try:
-                    master_data["roli"] = (
-                        pd.read_excel(uploaded_file)
-                        .rename(
-                            columns = {
-                                "COUNTRY" : "country",
-                                "CODE"    : "code",
-                                "YEAR"    : "year"
-                            }
+                    check_upload_size(uploaded_file.size)
+                    upload_fmt     = upload_format(uploaded_file.name)
+                    upload_content = uploaded_file.getvalue()
+                    dataset_fingerprint = hashlib.sha256(upload_content).hexdigest()
+
+                    available_variables = session_uploads().get_or_create(
+                        (dataset_fingerprint, None),
+                        lambda: custom_variables(upload_content, upload_fmt)
+                    )
+                    target_variable = st.selectbox(
+                        "Select a variable from the following list:",
+                        available_variables
+                    )
+
+                    custom_roli, unmatched_codes = session_uploads().get_or_create(
+                        (dataset_fingerprint, target_variable),
+                        lambda: match_codes(
+                            read_custom_data(upload_content, upload_fmt, target_variable),
+                            master_data["boundaries"]["WB_A3"]
                         )
                     )
-                    master_data["roli"]["year"] = master_data["roli"]["year"].astype(str)
+                    if not unmatched_codes.empty:
+                        st.warning(
+                            f"{unmatched_codes.sum():,} rows were dropped because their code does not "
+                            f"match any country: {', '.join(unmatched_codes.index[:20])}"
+                            f"{'...' if len(unmatched_codes) > 20 else ''}",
+                            icon = "⚠️"
+                        )
+                    if custom_roli.empty:
+                        raise ValueError("None of the codes in the file match a country code (WB_A3).")
+
+                    # The uploaded scores replace the ROLI scores in a copy of the mapping
+                    # that lives for this run only. The shared frames are not copied
+                    master_data = dict(master_data, roli = custom_roli)
 
                     data_preview = st.expander("Click here to preview your data")
                     with data_preview:
-                        st.write(master_data["roli"])
+                        st.write(custom_roli.head(PREVIEW_ROWS))
+                        st.caption(f"{len(custom_roli):,} rows")
 
-                    cnames = master_data["roli"].columns
-                    available_variables = [
-                        col for col in cnames 
-                        if col not in ["country", "year", "code"]
-                    ]
                     available_years = sorted(
-                        master_data["roli"]["year"].unique().tolist(),
+                        custom_roli["year"].unique().tolist(),
                         reverse = True
                     )
-                    
-                    target_variable = st.selectbox(
-                        "Select a variable from the following list:",
-                        available_variables
-                    )
                     target_year = st.selectbox(
                         "Select which year do you want to display from the following list:",
                         available_years
@@ -321,15 +417,25 @@ if check_password():
                     with ceiling_input:
                         ceiling = st.number_input("What's the maximum expected value?")
 
+                    custom_ready = True
+
                 except Exception as e:
-                    st.error("Error: Unable to read the file. Please upload a valid Excel file.")
+                    st.error("Error: Unable to read the file. Please upload a valid Excel, CSV or Parquet file.")
                     st.exception(e)
         
         else:
-            available_variables = dict(
-                zip(master_data["roli"].iloc[:, 4:].columns.tolist(),
-                variable_labels)
-            )
+            session_uploads().clear()
+            dataset_fingerprint = master_data["fingerprint"]
+            if "labels" in master_data:
+                available_variables = {
+                    variable: master_data["labels"].get(variable, variable)
+                    for variable in master_data["roli"].iloc[:, 4:].columns
+                }
+            else:
+                available_variables = dict(
+                    zip(master_data["roli"].iloc[:, 4:].columns.tolist(),
+                    variable_labels)
+                )
             available_years = sorted(
                 master_data["roli"]["year"].unique().tolist(),
                 reverse = True
@@ -347,7 +453,7 @@ if check_password():
             floor   = 0
             ceiling = 1
 
-            if target_year != "2012-2013":
+            if target_year != min(available_years):
                 delta_bin = st.checkbox(
                     "Would you like to display yearly percentage changes?",
                     help = "This will transform the variables into categorical groups."
@@ -394,11 +500,7 @@ if check_password():
                 )
             
             bin_edges  = [floor] + value_breaks + [ceiling]
-            bin_labels = []
-            for x,y in enumerate(bin_edges):
-                if x < len(bin_edges) - 1:
-                    b = f"From {y:.2f} to {bin_edges[x+1]:.2f}"
-                    bin_labels.append(b)
+            bin_labels = delta_bin_labels(bin_edges)
 
     st.markdown("""---""")
 
@@ -493,6 +595,29 @@ if check_password():
                 help = "The map has a resolution of 72 PPI"
             )
 
+        svgz = st.toggle(
+            "Compress SVG downloads (SVGZ)",
+            value = False,
+            help  = "Gzip-compressed SVG files are several times smaller and open in most vector editors"
+        )
+        svg_format = "svgz" if svgz else "svg"
+
+        quantize_svg = st.toggle(
+            "Optimize SVG downloads",
+            value = True,
+            help  = (
+                "Rounds the map coordinates to the pixel grid of the selected DPI and drops "
+                "the points that fall on the same pixel. Files are much smaller and look "
+                "the same at that resolution. Turn it off to keep full precision."
+            )
+        )
+
+        track_memory = st.toggle(
+            "Track memory in the timing breakdown",
+            value = False,
+            help  = "Records the peak memory of every stage. Rendering gets several times slower."
+        )
+
     st.markdown("""---""")
 
     # OUTPUT CONTAINER
@@ -534,286 +659,294 @@ if check_password():
             unsafe_allow_html = True
         )
 
+        multi_maps = False
+        grid_map   = False
+        web_map    = False
+
         if data_input == "Custom Data":
             if uploaded_file is None:
                 st.error("Please upload a file to continue", icon = "🚨")
                 submit_button = False
+            elif not custom_ready:
+                submit_button = False
+            else:
+                submit_button = st.button(label = "Display")
         else:
+            output_mode = st.radio(
+                "What would you like to draw?",
+                # The worker processes and the web map tiles only hold the countries
+                (["Single map", "Time series grid"] if extension == "Mexican states" else
+                 ["Single map", "Several maps", "Time series grid", "Interactive map"]),
+                horizontal = True,
+                help       = (
+                    "Several maps draws one map per selected variable and year, in parallel. "
+                    "The time series grid draws one panel per selected year in a single figure. "
+                    "The interactive map is drawn by your browser and can be panned and zoomed; "
+                    "it is updated as soon as you change the settings."
+                )
+            )
+            multi_maps = output_mode == "Several maps"
+            grid_map   = output_mode == "Time series grid"
+            web_map    = output_mode == "Interactive map"
+            if multi_maps:
+                cvariables, cyears = st.columns(2)
+                with cvariables:
+                    map_variables = st.multiselect(
+                        "Variables to draw:",
+                        list(available_variables.keys()),
+                        default     = [target_variable],
+                        format_func = lambda x: available_variables[x]
+                    )
+                with cyears:
+                    map_years = st.multiselect(
+                        "Years to draw:",
+                        available_years,
+                        default = [target_year]
+                    )
+            if grid_map:
+                grid_years = st.multiselect(
+                    "Years to draw:",
+                    sorted(available_years),
+                    default = sorted(available_years)
+                )
+                # Years that are not later than the base year have no change to draw
+                grid_years = [y for y in sorted(grid_years) if not delta_bin or base_year < y]
             submit_button = st.button(label = "Display")
 
 
     # BACKEND OPERATIONS
-    if submit_button:
-
-        if not delta_bin:
-            filtered_roli = master_data["roli"][master_data["roli"]["year"] == target_year]
-        
-        else:
-            filtered_roli = master_data["roli"]
-
-            if base_year is not None:
-                pattern = str(target_year) + "|" + str(base_year)
-                filtered_roli = (
-                    filtered_roli[filtered_roli["year"]
-                    .str.contains(pattern)]
-                )
-            
-            filtered_roli = (
-                filtered_roli
-                .sort_values(["country", "year"])
-                .set_index(["country", "code", "year", "region"])
-                .select_dtypes(np.number)
-                .groupby("country")
-                .pct_change()
-                .reset_index()
-            )
-            
-            filtered_roli = filtered_roli[filtered_roli["year"] == target_year]
-
-            filtered_roli["score"] = filtered_roli[target_variable]
-            filtered_roli[target_variable] = (
-                pd.cut(filtered_roli[target_variable],
-                bins   = bin_edges,
-                labels = bin_labels)
-            ) 
-
-        data4map = master_data["boundaries"].merge(
-            filtered_roli,
-            left_on  = "WB_A3", 
-            right_on = "code",
-            how      = "left"
-        )
-        
-        if extension != "World":
-            
-            if extension == "Regional":
+    # The interactive map is cheap to update, so it follows the settings without waiting
+    # for the Display button
+    if submit_button or web_map:
 
-                regions_coords = (bbox_coords[bbox_coords["region"].isin(selected_regions)])
+        if extension == "Regional":
+            bounds = region_bounds(selected_regions)
 
-                min_X = regions_coords.min_X.min()
-                min_Y = regions_coords.min_Y.min() 
-                max_X = regions_coords.max_X.max() 
-                max_Y = regions_coords.max_Y.max() 
-                bbox  = box(min_X, min_Y, max_X, max_Y)
+        elif extension == "Custom":
+            bounds = (min_lon, min_lat, max_lon, max_lat)
 
-            if extension == "Custom":
-                bbox  = box(min_lon, min_lat, max_lon, max_lat)
-            
-            # Masking the world map using the bounding box
-            # We also changed the projection to Miller Cilindrical Projection
-            # See: https://epsg.io/54003
+        elif extension == "Mexican states":
+            bounds = tuple(master_data["boundaries"].total_bounds)
 
-            data4drawing = data4map[data4map.intersects(bbox)].copy()
-            data4drawing.loc[:, "geometry"] = data4drawing.intersection(bbox)
-            data4drawing = data4drawing.to_crs("ESRI:54003")
-        
         else:
-            data4drawing = data4map.copy()
-        
-        missing_kwds = {
-            "color"    : "#EBEBEB",
-            "edgecolor": "#EBEBEB",
-            "label"    : "Missing values",
-            "alpha"    : 1
+            bounds = WORLD_BOUNDS
+
+        bounds = extension_key(bounds)
+
+        # Identical requests are served from the render cache. The key covers every
+        # parameter that changes the outputs, including the dataset itself
+        render_params = {
+            "dataset"      : dataset_fingerprint,
+            "extension"    : extension,
+            "bounds"       : bounds,
+            "highlighted"  : sorted(highlighted_countries) if highlighted_countries is not None else None,
+            "opacity"      : opac,
+            "variable"     : target_variable,
+            "year"         : target_year,
+            "delta"        : delta_bin,
+            "base_year"    : base_year if delta_bin else None,
+            "bins"         : bin_edges if delta_bin else None,
+            "colors"       : color_breaks,
+            "floor"        : floor,
+            "ceiling"      : ceiling,
+            "width_in"     : width_in,
+            "height_in"    : height_in,
+            "dpi"          : dpi,
+            "linewidth"    : linewidth,
+            "color_bar"    : color_bar,
+            "quantize_svg" : quantize_svg
         }
+        if web_map:
+
+            # The browser draws the boundaries from the tiles served in ./static, so
+            # only the colors and tooltips of the countries are sent
+            with st.spinner("Preparing the map tiles..."):
+                tile_manifest()
+            components.html(
+                web_map_html(web_map_data(render_params, master_data)),
+                height = WEB_MAP_HEIGHT + 40
+            )
 
-        colors_list = color_breaks
-        cmap_name   = "default_cmap"
+        elif grid_map and not grid_years:
+            st.warning("There are no years to draw. Please select at least one year "
+                       "(later than the base year when showing changes).")
+
+        elif grid_map:
+
+            # All the panels share one pass of clipped and projected geometries
+            grid_params = dict(render_params, grid_years = grid_years, svg_format = svg_format)
+            grid_key    = content_key(grid_params)
+            outputs     = render_cache().get(grid_key)
+            cached      = outputs is not None
+
+            with StageTimer("grid", memory = track_memory and not cached, 
+                            params = grid_params, cached = cached) as timer:
+                if not cached:
+                    outputs = render_cache().put(
+                        grid_key,
+                        render_year_grid(
+                            render_params,
+                            master_data,
+                            grid_years,
+                            geometry_cache = geometry_cache(),
+                            formats        = ("png", svg_format),
+                            timer          = timer
+                        )
+                    )
 
-        if not delta_bin:
-            cmap = colors.LinearSegmentedColormap.from_list(cmap_name, colors_list)
-        else:
-            value2color     = dict(zip(bin_labels, color_breaks))
-            colors_list     = [value2color[value] for value in bin_labels]
-            cmap            = colors.ListedColormap(colors_list)
-        
-        if opac:
-            data4drawing["alpha"] = (
-                data4drawing["WB_A3"]
-                .apply(lambda x: 1 if x in highlighted_countries else 0.2)
-            )
-        else:
-            data4drawing["alpha"] = 1
+                with timer.stage("display"):
+                    st.image(outputs["grid_png"])
+                st.download_button(
+                    label     = "Save Grid",
+                    data      = outputs[f"grid_{svg_format}"],
+                    file_name = f"choropleth_grid_{target_variable}.{svg_format}",
+                    mime      = MIME_TYPES[svg_format],
+                    key       = "download-grid"
+                )
 
-        if opac and delta_bin:
-            data4drawing.loc[~data4drawing["WB_A3"].isin(highlighted_countries), target_variable] = np.nan
-        
-        map_tab, table_tab, graph_tab = st.tabs(["Map", "Table", "Graph"])
+            timing_breakdown(timer, cached)
 
+        elif multi_maps:
 
-        with map_tab:
-            fig, ax = plt.subplots(
-                1, 
-                figsize = (width_in, height_in),
-                dpi     = dpi
-            )
-            if not delta_bin:
-                data4drawing.plot(
-                    column       = target_variable, 
-                    cmap         = cmap,
-                    linewidth    = linewidth,
-                    ax           = ax,
-                    edgecolor    = "#EBEBEB",
-                    legend       = color_bar,
-                    vmin         = floor,
-                    vmax         = ceiling,
-                    alpha        = data4drawing.dropna(subset = ["country"]).alpha,
-                    missing_kwds = missing_kwds
+            # One request per selected variable and year. Cached maps are reused and the
+            # rest are drawn in parallel by the worker processes
+            map_requests = [
+                dict(render_params, variable = v, year = y)
+                for v in map_variables
+                for y in map_years
+                if not delta_bin or base_year < y
+            ]
+            map_exports = (f"map_{svg_format}", "table_xlsx")
+            map_keys    = [content_key(dict(request, exports = map_exports)) for request in map_requests]
+            results     = {key: render_cache().get(key) for key in map_keys}
+            pending     = {
+                worker_pool().submit(render_request, request, exports = map_exports): key
+                for request, key in zip(map_requests, map_keys)
+                if results[key] is None
+            }
+
+            with st.spinner(f"Rendering {len(pending)} maps in parallel..."):
+                for future in as_completed(pending):
+                    results[pending[future]] = render_cache().put(pending[future], future.result())
+
+            if delta_bin and len(map_requests) < len(map_variables) * len(map_years):
+                st.warning("Years that are not later than the base year were skipped.")
+
+            for request, key in zip(map_requests, map_keys):
+                outputs = results[key]
+                st.markdown(
+                    f"<h5>{available_variables[request['variable']]} ({request['year']})</h5>",
+                    unsafe_allow_html = True
                 )
-            else: 
-                data4drawing.plot(
-                    column       = target_variable, 
-                    cmap         = cmap,
-                    linewidth    = linewidth,
-                    ax           = ax,
-                    edgecolor    = "#EBEBEB",
-                    legend       = color_bar,
-                    alpha        = None,
-                    missing_kwds = missing_kwds
+                st.image(outputs["map_png"])
+
+                cmap_dl, ctable_dl = st.columns(2)
+                cmap_dl.download_button(
+                    label     = "Save Map", 
+                    data      = outputs[f"map_{svg_format}"], 
+                    file_name = f"choropleth_map_{request['variable']}_{request['year']}.{svg_format}",
+                    mime      = MIME_TYPES[svg_format],
+                    key       = f"download-map-{key}"
+                )
+                ctable_dl.download_button(
+                    label     = "Download Table as an Excel file",
+                    data      = outputs["table_xlsx"],
+                    file_name = f"color_map_{request['variable']}_{request['year']}.xlsx",
+                    mime      = MIME_TYPES["xlsx"],
+                    key       = f"download-table-{key}"
                 )
-            ax.axis("off")
 
-            st.pyplot(fig)
+        else:
+            # The downloads are saved from the same figures as the previews
+            exports    = (f"map_{svg_format}", "table_xlsx", f"chart_{svg_format}")
+            render_key = content_key(dict(render_params, exports = exports))
+            outputs    = render_cache().get(render_key)
+            cached     = outputs is not None
+
+            with StageTimer("map", memory = track_memory and not cached, 
+                            params = render_params, cached = cached) as timer:
+                if not cached:
+                    outputs = render_cache().put(
+                        render_key,
+                        render_outputs(
+                            render_params,
+                            master_data,
+                            geometry_cache = geometry_cache(),
+                            exports        = exports,
+                            timer          = timer
+                        )
+                    )
 
-            svg_file = io.StringIO()
-            plt.savefig(svg_file, format = "svg")
-            
-            st.download_button(
-                label     = "Save Map", 
-                data      = svg_file.getvalue(), 
-                file_name = "choropleth_map.svg",
-                key       = "download-map"
-            )
+                map_tab, table_tab, graph_tab = st.tabs(["Map", "Table", "Graph"])
 
 
-        with table_tab:
+                with map_tab, timer.stage("display"):
+                    st.image(outputs["map_png"])
 
-            buffer = io.BytesIO()
-            outcome_table = (
-                pd.DataFrame(data4drawing.drop(columns = "geometry"))
-            )     
-            outcome_table = outcome_table[outcome_table["year"] == target_year]
-        
-            if not delta_bin:
-                outcome_table = (
-                    outcome_table[["country", "WB_A3", target_variable]]
-                    .sort_values(by = "country", ascending = True)
-                )
-                
-            else:
-                outcome_table = (
-                    outcome_table[["country", "WB_A3", target_variable, "score"]]
-                    .sort_values(by = "country", ascending = True)
-                )
-                original_scores = master_data["roli"][master_data["roli"]["year"] == target_year][["country", "code", target_variable]]
-                outcome_table = outcome_table.merge(
-                    original_scores[["country", "code", target_variable]],
-                    left_on="WB_A3", right_on="code",
-                    suffixes=("_pct_change", "_original")
-                )
-                            
-                outcome_table["change"] = outcome_table["score"]
-                outcome_table["score"] = outcome_table[f"{target_variable}_original"]
-                outcome_table  = outcome_table.rename(
-                    columns={
-                        "country_pct_change": "country",
-                        "roli_pct_change": "roli"
-                    }
-                )
-                outcome_table = outcome_table.drop(
-                    columns = ["country_original", "roli_original", "code"]
-                )
+                    st.download_button(
+                        label     = "Save Map",
+                        data      = outputs[f"map_{svg_format}"],
+                        file_name = f"choropleth_map.{svg_format}",
+                        mime      = MIME_TYPES[svg_format],
+                        key       = "download-map"
+                    )
 
-            if not delta_bin:
-                minmax = pd.DataFrame(
-                    {
-                        "country"       : ["Floor-Ceiling", "Floor-Ceiling"],
-                        "WB_A3"         : ["Floor-Ceiling", "Floor-Ceiling"], 
-                        target_variable : [floor, ceiling]
-                    }
-                )
 
-                outcome_table["color_code"] = (
-                    outcome_table.apply(
-                        lambda row: (
-                            colors.rgb2hex(plt.cm.get_cmap(cmap)(row[target_variable]))        
-                        ), 
-                        axis = 1
+                with table_tab:
+                    st.write(outputs["table"])
+
+                    st.download_button(
+                        label     = "Download Table as an Excel file",
+                        data      = outputs["table_xlsx"],
+                        file_name = "color_map.xlsx",
+                        mime      = MIME_TYPES["xlsx"]
                     )
-                )
-                
-                outcome_table = (
-                    outcome_table
-                    .query("WB_A3 != 'Floor-Ceiling'")
-                )
-            
-            else:
-                outcome_table["color_code"] = (
-                    outcome_table[target_variable]
-                    .map(value2color)
-                )
 
-            if extension == "Regional" or extension == "Custom":
-                outcome_table = outcome_table[outcome_table["WB_A3"].isin(highlighted_countries)]
-
-            if delta_bin:
-                outcome_table = outcome_table.drop(columns=["roli"])
-                outcome_table["score"] = outcome_table["score"]*100
-                outcome_table["change"] = outcome_table["change"]*100
-            st.write(outcome_table)
-
-            # You need to install the XlsxWriter. See: https://xlsxwriter.readthedocs.io/
-            with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-                outcome_table.to_excel(writer, sheet_name = "Data-Table")
-                writer.close()
-
-            st.download_button(
-                label     = "Download Table as an Excel file",
-                data      = buffer,
-                file_name = "color_map.xlsx",
-                mime      = "application/vnd.ms-excel"
-            )
-        
 
-        with graph_tab:
-            
-            if not delta_bin:
-                h = len(outcome_table)/5
-                bars = plt.figure(figsize = (10, h))
-                plt.barh(
-                    outcome_table["country"],
-                    outcome_table[target_variable], 
-                    color = outcome_table["color_code"]
-                )
-                plt.gca().invert_yaxis()
-                plt.margins(y = 0)
+                with graph_tab:
+                    st.image(outputs["chart_png"])
 
-            else:
-                outcome_table = (
-                    outcome_table
-                    .dropna(subset = ["change", "color_code"])
-                    .sort_values("change", ascending = False)
-                )
-                h = len(outcome_table)/5
-                bars = plt.figure(figsize = (10, h))
-                plt.barh(
-                    outcome_table["country"],
-                    outcome_table["change"], 
-                    color = outcome_table["color_code"]
-                )
-                plt.gca().invert_yaxis()
-                plt.margins(y = 0)
+                    st.download_button(
+                        label     = "Save Chart",
+                        data      = outputs[f"chart_{svg_format}"],
+                        file_name = f"bar_chart.{svg_format}",
+                        mime      = MIME_TYPES[svg_format],
+                        key       = "download-chart"
+                    )
 
-            plt.title("Scores by Country")
-            st.pyplot(bars)
-            svg_file = io.StringIO()
-            plt.savefig(svg_file, format = "svg")
-            
-            st.download_button(
-                label     = "Save Chart", 
-                data      = svg_file.getvalue(), 
-                file_name = "bar_chart.svg",
-                key       = "download-chart"
-            )  
+            timing_breakdown(timer, cached)
 
-            
+
+    # RENDER CACHE STATISTICS
+    with st.sidebar:
+        stats = render_cache().stats()
+        st.markdown("<h4>Render cache</h4>", unsafe_allow_html = True)
+        chits, cmisses = st.columns(2)
+        chits.metric("Hits", stats["hits"])
+        cmisses.metric("Misses", stats["misses"])
+        st.caption(
+            f"{stats['entries']} of {stats['max_entries']} maps cached, "
+            f"{stats['nbytes'] / 1024**2:.1f} of {stats['max_bytes'] / 1024**2:.0f} MB"
+        )
+
+    # STARTUP REPORT
+    with st.sidebar:
+        report = startup_report()
+        with st.expander("Startup"):
+            st.dataframe(
+                pd.DataFrame(
+                    [("import", name, seconds) for name, seconds in report["imports"].items()] +
+                    [("load", name, seconds) for name, seconds in report["loads"].items()],
+                    columns = ["step", "name", "seconds"]
+                ),
+                hide_index    = True,
+                column_config = {"seconds": st.column_config.NumberColumn("Seconds", format = "%.3f")}
+            )
+            if not PREWARM:
+                st.caption("Pre-warming is turned off (ROLI_PREWARM=0).")
+            elif report["prewarm"] is None:
+                st.caption("Pre-warming...")
+            elif "error" in report["prewarm"]:
+                st.caption(f"Pre-warming failed: {report['prewarm']['error']}")
+            else:
+                st.caption(f"Pre-warmed in the background in {report['prewarm']['seconds']:.2f} s.")
@@ -0,0 +1,77 @@
+"""
+Bounding box clipping benchmark: full-table `intersects()` + `intersection()` (legacy
+path) versus the spatial-index query used by `clip_to_bbox()`.
+
+Both paths run on the Miller-projected boundaries for every region in `bbox_coords`.
+The script also checks that both paths select the same countries and produce the same
+clipped areas.
+
+Usage:
+    python benchmarks/bench_clip.py [--data-dir Data] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from src.utils.data_adds import bbox_coords
+from src.utils.data_loading import load_boundaries
+from src.utils.geometry import MILLER, project_bbox, clip_to_bbox
+
+
+def legacy_clip(boundaries, bbox):
+    """Reproduces the original app behaviour: scan and clip every geometry."""
+    clipped = boundaries[boundaries.intersects(bbox)].copy()
+    clipped.loc[:, "geometry"] = clipped.intersection(bbox)
+    return clipped
+
+
+def best_of(repeat, func, *args):
+    """Returns the fastest wall time of `repeat` calls and the last result."""
+    timings = []
+    for _ in range(repeat):
+        start  = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default = os.path.join(ROOT, "Data"))
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    boundaries = load_boundaries(args.data_dir).to_crs(MILLER)
+    boundaries.sindex
+
+    print(f"{'region':<34}{'countries':>10}{'clipped':>9}{'legacy (ms)':>13}{'sindex (ms)':>13}{'speedup':>9}")
+    total_old = total_new = 0
+    mismatches = []
+    for region, *bounds in bbox_coords.itertuples(index = False):
+        bbox = project_bbox(bounds)
+        t_old, legacy  = best_of(args.repeat, legacy_clip, boundaries, bbox)
+        t_new, current = best_of(args.repeat, clip_to_bbox, boundaries, bbox)
+        total_old += t_old
+        total_new += t_new
+
+        same_rows = legacy.index.equals(current.index)
+        if not same_rows or (legacy.area - current.area).abs().max() > 1e-6 * legacy.area.max():
+            mismatches.append(region)
+
+        n_clipped = int((current.geometry.area < boundaries.loc[current.index].area - 1e-9).sum())
+        print(f"{region:<34}{len(current):>10}{n_clipped:>9}{t_old * 1000:>13.2f}"
+              f"{t_new * 1000:>13.2f}{t_old / t_new:>8.1f}x")
+
+    print(f"{'total':<53}{total_old * 1000:>13.2f}{total_new * 1000:>13.2f}{total_old / total_new:>8.1f}x")
+    if mismatches:
+        print(f"Outputs differ for: {', '.join(mismatches)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
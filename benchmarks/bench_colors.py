@@ -0,0 +1,60 @@
+"""
+Color-code benchmark: per-row `apply` + `rgb2hex` (legacy Table tab) versus the batched
+helpers in `src.utils.coloring`.
+
+Usage:
+    python benchmarks/bench_colors.py [--sizes 1000 100000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+import matplotlib.colors as colors
+import matplotlib.pyplot as plt
+
+from src.utils.coloring import score_hex_codes
+
+PALETTE = ["#D40276", "#E51328", "#f2a241", "#ccc555", "#578e7f", "#012d28"]
+
+
+def legacy_codes(table, cmap):
+    """Reproduces the original Table tab: one colormap lookup per row."""
+    return table.apply(
+        lambda row: colors.rgb2hex(plt.get_cmap(cmap)(row["score"])),
+        axis = 1
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 100000])
+    args = parser.parse_args()
+
+    cmap = colors.LinearSegmentedColormap.from_list("default_cmap", PALETTE)
+    rng  = np.random.default_rng(0)
+
+    print(f"{'rows':>8}{'legacy (ms)':>14}{'batched (ms)':>14}{'speedup':>10}")
+    for size in args.sizes:
+        table = pd.DataFrame({"score": rng.uniform(0, 1, size)})
+
+        start  = time.perf_counter()
+        legacy = legacy_codes(table, cmap)
+        t_old  = time.perf_counter() - start
+
+        start  = time.perf_counter()
+        codes  = score_hex_codes(table["score"], cmap, 0, 1)
+        t_new  = time.perf_counter() - start
+
+        assert (legacy.to_numpy() == codes).all(), "Batched colors differ from rgb2hex"
+        print(f"{size:>8}{t_old * 1000:>14.1f}{t_new * 1000:>14.2f}{t_old / t_new:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
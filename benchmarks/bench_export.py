@@ -0,0 +1,98 @@
+"""
+Export benchmark and memory-growth check.
+
+Runs consecutive map requests through `render_outputs()` (previews plus every export),
+cycling over variables and years, and records the resident memory of the process
+after each one. The script fails if memory keeps growing once the caches are warm or
+if any pyplot figure is left open. It also times a request with each download alone
+and compares SVG and SVGZ sizes.
+
+Usage:
+    python benchmarks/bench_export.py [--data-dir Data] [--renders 100] [--max-growth-mb 20]
+"""
+
+import argparse
+import gzip
+import itertools
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from src.utils.caching import LRUCache
+from src.utils.rendering import load_master_data, request_params, render_outputs
+
+EXPORTS = ["map_svg", "map_svgz", "chart_svg", "chart_svgz", "table_xlsx"]
+
+
+def rss_mb():
+    """Returns the resident set size of the process in MB (Linux only)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default = os.path.join(ROOT, "Data"))
+    parser.add_argument("--renders", type = int, default = 100)
+    parser.add_argument("--warmup", type = int, default = 10)
+    parser.add_argument("--max-growth-mb", type = float, default = 20)
+    args = parser.parse_args()
+
+    data      = load_master_data(args.data_dir)
+    variables = data["roli"].iloc[:, 4:].columns.tolist()[:5]
+    years     = sorted(data["roli"]["year"].unique())[-4:]
+    requests  = itertools.cycle(
+        request_params(data, variable = v, year = y, width_in = 12, height_in = 8)
+        for v, y in itertools.product(variables, years)
+    )
+    geometry_cache = LRUCache(max_entries = 16, max_bytes = 128 * 1024**2)
+
+    memory  = []
+    start   = time.perf_counter()
+    for _ in range(args.renders):
+        outputs = render_outputs(next(requests), data, geometry_cache = geometry_cache,
+                                 exports = EXPORTS)
+        memory.append(rss_mb())
+    elapsed = time.perf_counter() - start
+
+    baseline = memory[min(args.warmup, len(memory)) - 1]
+    growth   = memory[-1] - baseline
+    print(f"{args.renders} renders in {elapsed:.1f}s ({elapsed / args.renders * 1000:.0f} ms each)")
+    print(f"RSS after {args.warmup} renders: {baseline:.1f} MB, after {args.renders}: "
+          f"{memory[-1]:.1f} MB (growth {growth:+.1f} MB, peak {max(memory):.1f} MB)")
+    print(f"Open pyplot figures: {len(plt.get_fignums())}")
+
+    params = next(requests)
+    print(f"\n{'export':<12}{'request (ms)':>16}{'size (KB)':>11}")
+    for name in EXPORTS:
+        start   = time.perf_counter()
+        content = render_outputs(params, data, geometry_cache = geometry_cache,
+                                 exports = (name,))[name]
+        print(f"{name:<12}{(time.perf_counter() - start) * 1000:>16.1f}{len(content) / 1024:>11.1f}")
+        if name.endswith("svgz"):
+            gzip.decompress(content)
+
+    failures = []
+    if growth > args.max_growth_mb:
+        failures.append(f"memory grew by {growth:.1f} MB")
+    if plt.get_fignums():
+        failures.append(f"{len(plt.get_fignums())} figures left open")
+    if not all(outputs.get(name) for name in EXPORTS):
+        failures.append("missing exports")
+    if failures:
+        print("FAILED: " + ", ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
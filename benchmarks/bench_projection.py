@@ -0,0 +1,79 @@
+"""
+Regional clipping benchmark: clipping then projecting (legacy path) versus clipping the
+pre-projected boundaries with a projected bounding box (current path).
+
+Besides timing both paths for every region in `bbox_coords`, the script checks that the
+current output matches the legacy projection within a tolerance, and exits with a
+non-zero status when it does not.
+
+Usage:
+    python benchmarks/bench_projection.py [--data-dir Data] [--tolerance 1e-4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from shapely.geometry import box
+
+from src.utils.data_adds import bbox_coords
+from src.utils.data_loading import load_boundaries
+from src.utils.geometry import MILLER, project_bbox, clip_to_bbox
+
+
+def legacy_clip(boundaries, bounds):
+    """Reproduces the original app behaviour: clip in WGS84, then project."""
+    bbox     = box(*bounds)
+    clipped  = boundaries[boundaries.intersects(bbox)].copy()
+    clipped.loc[:, "geometry"] = clipped.intersection(bbox)
+    return clipped.to_crs(MILLER)
+
+
+def mismatch(legacy, current):
+    """Returns the worst per-country symmetric difference, relative to the country area."""
+    legacy  = legacy.geometry
+    current = current.geometry
+    if set(legacy.index) != set(current.index):
+        return float("inf")
+    current = current.loc[legacy.index]
+    area    = legacy.area.where(legacy.area > 0)
+    diff    = legacy.symmetric_difference(current, align = False).area
+    return float((diff / area).fillna(0).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default = os.path.join(ROOT, "Data"))
+    parser.add_argument("--tolerance", type = float, default = 1e-4)
+    args = parser.parse_args()
+
+    boundaries        = load_boundaries(args.data_dir)
+    boundaries_miller = boundaries.to_crs(MILLER)
+
+    print(f"{'region':<34}{'legacy (ms)':>13}{'current (ms)':>14}{'max rel. diff':>15}")
+    failed = []
+    for region, *bounds in bbox_coords.itertuples(index = False):
+        start   = time.perf_counter()
+        legacy  = legacy_clip(boundaries, bounds)
+        t_old   = time.perf_counter() - start
+
+        start   = time.perf_counter()
+        current = clip_to_bbox(boundaries_miller, project_bbox(bounds))
+        t_new   = time.perf_counter() - start
+
+        error   = mismatch(legacy, current)
+        if error > args.tolerance:
+            failed.append(region)
+        print(f"{region:<34}{t_old * 1000:>13.1f}{t_new * 1000:>14.1f}{error:>15.2e}")
+
+    if failed:
+        print(f"Projection mismatch above {args.tolerance} for: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
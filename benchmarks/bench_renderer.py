@@ -0,0 +1,118 @@
+"""
+Map drawing benchmark: `data4drawing.plot(...)` on a new figure (legacy path) versus
+recoloring a cached `MapRenderer`.
+
+For each extent (world, a WJP region and a custom box) the script times the legacy
+plot, the first renderer draw (path building included) and the repeated draws of a
+warm renderer, saving a PNG each time. It also checks that both paths produce
+images of the same size.
+
+Usage:
+    python benchmarks/bench_renderer.py [--data-dir Data] [--repeat 5]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib import cm, colors
+from PIL import Image
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from src.utils.coloring import MISSING_COLOR, score_colors
+from src.utils.exporting import figure_bytes
+from src.utils.map_renderer import EDGE_COLOR, MapRenderer
+from src.utils.rendering import (load_master_data, request_params, filter_scores,
+                                 map_boundaries, map_data, color_map, draw_map)
+
+EXTENTS = {
+    "World"          : {},
+    "East Asia"      : {"regions": ["East Asia and Pacific"]},
+    "Custom (Andes)" : {"extension": "Custom", "bounds": (-82, -56, -60, 13)}
+}
+
+
+def legacy_png(params, data4drawing, cmap):
+    """Reproduces the original app behaviour: plot the GeoDataFrame on a new figure."""
+    fig, ax = plt.subplots(1, figsize = (params["width_in"], params["height_in"]),
+                           dpi = params["dpi"])
+    data4drawing.plot(
+        color     = score_colors(data4drawing[params["variable"]], cmap,
+                                 params["floor"], params["ceiling"],
+                                 alpha = data4drawing["alpha"]),
+        linewidth = params["linewidth"],
+        ax        = ax,
+        edgecolor = EDGE_COLOR,
+        missing_kwds = {"color": MISSING_COLOR}
+    )
+    norm = colors.Normalize(vmin = params["floor"], vmax = params["ceiling"])
+    fig.colorbar(cm.ScalarMappable(norm = norm, cmap = cmap), ax = ax)
+    ax.axis("off")
+    png = figure_bytes(fig, "png", bbox_inches = "tight")
+    plt.close(fig)
+    return png
+
+
+def renderer_png(params, data4drawing, renderer, cmap):
+    """Recolors the renderer and saves the map."""
+    with renderer.lock:
+        fig = draw_map(params, data4drawing, renderer, cmap, None)
+        return figure_bytes(fig, "png", bbox_inches = "tight")
+
+
+def best_of(repeat, func, *args):
+    """Returns the fastest wall time of `repeat` calls and the last result."""
+    timings = []
+    for _ in range(repeat):
+        start  = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default = os.path.join(ROOT, "Data"))
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    data = load_master_data(args.data_dir)
+    year = sorted(data["roli"]["year"].unique())[-1]
+
+    print(f"{'extent':<18}{'shapes':>8}{'legacy (ms)':>13}{'first (ms)':>12}"
+          f"{'warm (ms)':>11}{'speedup':>9}")
+    mismatches = []
+    for name, extent in EXTENTS.items():
+        params = request_params(data, variable = "roli", year = year, **extent)
+        boundaries   = map_boundaries(params, data)
+        data4drawing = map_data(params, boundaries, filter_scores(params, data))
+        cmap, _      = color_map(params)
+
+        t_old, old_png = best_of(args.repeat, legacy_png, params, data4drawing, cmap)
+
+        start    = time.perf_counter()
+        renderer = MapRenderer(boundaries)
+        renderer_png(params, data4drawing, renderer, cmap)
+        t_first  = time.perf_counter() - start
+        t_warm, new_png = best_of(args.repeat, renderer_png, params, data4drawing, renderer, cmap)
+
+        if Image.open(io.BytesIO(old_png)).size != Image.open(io.BytesIO(new_png)).size:
+            mismatches.append(name)
+
+        print(f"{name:<18}{len(boundaries):>8}{t_old * 1000:>13.1f}{t_first * 1000:>12.1f}"
+              f"{t_warm * 1000:>11.1f}{t_old / t_warm:>8.1f}x")
+
+    if mismatches:
+        print(f"Image sizes differ for: {', '.join(mismatches)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Startup benchmark for the boundary and ROLI score loaders.
+
+Each measurement runs in a fresh Python process so that it reflects a cold start of a
+Streamlit worker: the time spent loading the data and the resident memory of the
+process once it is loaded (current RSS, and the part added by the load itself).
+
+The ROLI scores are measured when parsed from the workbook with openpyxl (what every
+process did before, and what happens once after the workbook changes), when read
+from the Parquet cache, and when only the columns of one variable are read.
+
+The imports are measured the same way: the ones of the login page, and the data
+stack imported once the password was checked (see src/utils/startup.py).
+
+Usage:
+    python benchmarks/bench_startup.py [--data-dir Data] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(l.split()[1]) for l in f if l.startswith("VmRSS")) / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+from src.utils.data_loading import load_boundaries, load_roli, read_roli_workbook
+data_dir = {data_dir!r}
+baseline = rss_mb()
+start    = time.perf_counter()
+data     = {call}
+elapsed  = time.perf_counter() - start
+current  = rss_mb()
+print(json.dumps({{"seconds": elapsed, "rss_mb": current, "load_mb": current - baseline, "rows": len(data)}}))
+"""
+
+IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import streamlit, src.utils.passcheck, src.utils.startup
+login = time.perf_counter() - start
+src.utils.startup.import_modules()
+print(json.dumps({{"login": login, **src.utils.startup.startup_report()["imports"]}}))
+"""
+
+
+LOADS = {
+    "boundaries (GeoJSON)"  : "load_boundaries(data_dir, prefer = 'geojson')",
+    "boundaries (Parquet)"  : "load_boundaries(data_dir, prefer = 'parquet')",
+    "ROLI (XLSX, openpyxl)" : "read_roli_workbook(data_dir)",
+    "ROLI (Parquet cache)"  : "load_roli(data_dir)",
+    "ROLI (one variable)"   : "load_roli(data_dir, variables = ['roli'])"
+}
+
+
+def measure(data_dir, call):
+    """Runs a load in a fresh interpreter and returns its measurements."""
+    code = PROBE.format(root = ROOT, data_dir = data_dir, call = call)
+    out  = subprocess.run([sys.executable, "-c", code], 
+                          check = True, capture_output = True, text = True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure_imports():
+    """Imports the modules of the app in a fresh interpreter and returns their timings."""
+    code = IMPORT_PROBE.format(root = ROOT)
+    out  = subprocess.run([sys.executable, "-c", code], 
+                          check = True, capture_output = True, text = True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default = os.path.join(ROOT, "Data"))
+    parser.add_argument("--repeat", type = int, default = 3)
+    args = parser.parse_args()
+
+    from src.utils.data_loading import (boundary_store_is_valid, write_boundary_store, 
+                                        load_boundaries, roli_store_is_valid, write_roli_store)
+
+    if not boundary_store_is_valid(args.data_dir):
+        print("Building GeoParquet store from GeoJSON...")
+        write_boundary_store(load_boundaries(args.data_dir, prefer = "geojson"), args.data_dir)
+    if not roli_store_is_valid(args.data_dir):
+        print("Building the Parquet cache of the ROLI workbook...")
+        write_roli_store(args.data_dir)
+
+    print(f"{'load':<24}{'cold load (s)':>16}{'RSS (MB)':>16}{'load RSS (MB)':>16}")
+    for name, call in LOADS.items():
+        runs = [measure(args.data_dir, call) for _ in range(args.repeat)]
+        best = min(runs, key = lambda r: r["seconds"])
+        print(f"{name:<24}{best['seconds']:>16.3f}{best['rss_mb']:>16.1f}{best['load_mb']:>16.1f}")
+
+    runs = [measure_imports() for _ in range(args.repeat)]
+    print(f"\n{'import':<24}{'cold import (s)':>16}")
+    for name in runs[0]:
+        label = "login page" if name == "login" else name
+        print(f"{label:<24}{min(run.get(name, 0) for run in runs):>16.3f}")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT)
+    main()
@@ -0,0 +1,103 @@
+"""
+SVG export benchmark: full-precision matplotlib output versus `quantize_svg()`.
+
+For world and regional maps at several resolutions, the script compares the size
+(plain and gzip-compressed) and the export time of both outputs, and the number of
+path vertices written. It also checks that the optimized SVG is well-formed XML and
+that no vertex moved by more than half a pixel.
+
+Usage:
+    python benchmarks/bench_svg.py [--data-dir Data] [--dpi 72 100 300]
+"""
+
+import argparse
+import gzip
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import matplotlib
+matplotlib.use("Agg")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from src.utils.exporting import SVG_UNITS_PER_INCH, figure_bytes
+from src.utils.rendering import (load_master_data, request_params, prepare_request,
+                                 draw_map)
+
+EXTENTS = {
+    "World"     : {},
+    "LAC"       : {"regions": ["Latin America and Caribbean"]}
+}
+
+VERTEX = re.compile(r"[ML] (-?[\d.]+) (-?[\d.]+)")
+
+
+def map_svg(params, data, quantize):
+    """Draws the map of a request and returns its SVG and the export time."""
+    renderer, data4drawing, cmap, value2color = prepare_request(params, data)
+    with renderer.lock:
+        fig   = draw_map(params, data4drawing, renderer, cmap, value2color)
+        start = time.perf_counter()
+        svg   = figure_bytes(fig, "svg", quantize = quantize)
+    return svg, time.perf_counter() - start
+
+
+def max_shift(full, optimized):
+    """
+    Returns the largest distance (in SVG units) from a vertex of the optimized SVG
+    to the nearest original vertex of the same position in the file.
+    """
+    original = {(round(float(x), 3), round(float(y), 3)) for x, y in VERTEX.findall(full.decode())}
+    snapped  = [(float(x), float(y)) for x, y in VERTEX.findall(optimized.decode())]
+    grid     = sorted(original)
+    shift    = 0.0
+    for x, y in snapped[:2000]:
+        nearest = min(grid, key = lambda p: (p[0] - x)**2 + (p[1] - y)**2)
+        shift   = max(shift, ((nearest[0] - x)**2 + (nearest[1] - y)**2)**0.5)
+    return shift
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default = os.path.join(ROOT, "Data"))
+    parser.add_argument("--dpi", type = int, nargs = "+", default = [72, 100, 300])
+    args = parser.parse_args()
+
+    data = load_master_data(args.data_dir)
+    year = sorted(data["roli"]["year"].unique())[-1]
+
+    print(f"{'extent':<8}{'dpi':>5}{'full (KB)':>11}{'optimized':>11}{'full gz':>9}"
+          f"{'opt. gz':>9}{'vertices':>10}{'kept':>7}{'full (ms)':>11}{'opt. (ms)':>11}")
+    failures = []
+    for name, extent in EXTENTS.items():
+        for dpi in args.dpi:
+            params = request_params(data, variable = "roli", year = year, dpi = dpi, **extent)
+            full, t_full = map_svg(params, data, quantize = False)
+            optimized, t_opt = map_svg(params, data, quantize = True)
+
+            try:
+                ET.fromstring(optimized)
+            except ET.ParseError as e:
+                failures.append(f"{name} at {dpi} DPI is not valid XML ({e})")
+
+            shift = max_shift(full, optimized)
+            if shift > SVG_UNITS_PER_INCH / dpi * 0.71:
+                failures.append(f"{name} at {dpi} DPI moved a vertex by {shift:.2f} units")
+
+            n_full = len(VERTEX.findall(full.decode()))
+            n_opt  = len(VERTEX.findall(optimized.decode()))
+            print(f"{name:<8}{dpi:>5}{len(full) / 1024:>11.1f}{len(optimized) / 1024:>11.1f}"
+                  f"{len(gzip.compress(full)) / 1024:>9.1f}{len(gzip.compress(optimized)) / 1024:>9.1f}"
+                  f"{n_full:>10}{n_opt / n_full:>7.0%}{t_full * 1000:>11.1f}{t_opt * 1000:>11.1f}")
+
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Shared-arc storage benchmark: GeoParquet/GeoJSON boundaries versus the TopoJSON
+topology written by boundary_simplification.py.
+
+The script compares the vertices kept in memory by both stores and their loading
+time, then, for the world and every WJP region, the time needed to build the map
+renderer (materializing only the countries in the extension for the topology) and
+to draw the map (outlines of every polygon versus each border once). It also checks
+that both stores produce the same country areas.
+
+Usage:
+    python benchmarks/bench_topology.py [--data-dir Data] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+import shapely
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from src.utils.data_adds import wjp_regions
+from src.utils.data_loading import BOUNDARIES_TOPOJSON
+from src.utils.exporting import figure_bytes
+from src.utils.rendering import (load_master_data, request_params, prepare_request, draw_map,
+                                 map_renderer)
+
+
+def timed(func, *args, **kwargs):
+    """Returns the wall time of a call and its result."""
+    start  = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def draw_time(params, data, repeat):
+    """Returns the fastest time to draw and save the PNG of a request."""
+    renderer, data4drawing, cmap, value2color = prepare_request(params, data)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with renderer.lock:
+            figure_bytes(draw_map(params, data4drawing, renderer, cmap, value2color), "png")
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default = os.path.join(ROOT, "Data"))
+    parser.add_argument("--repeat", type = int, default = 3)
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.data_dir, BOUNDARIES_TOPOJSON)):
+        sys.exit(f"{BOUNDARIES_TOPOJSON} not found. Run boundary_simplification.py first.")
+
+    t_polygons, polygons = timed(load_master_data, args.data_dir)
+    t_topology, topology = timed(load_master_data, args.data_dir, topology = True)
+
+    # Comparing the full-resolution boundaries only
+    polygons["lod_levels"] = topology["lod_levels"] = []
+
+    n_polygons = len(shapely.get_coordinates(polygons["boundaries"].geometry.values))
+    n_arcs     = len(topology["topology"].arc_coords)
+    print(f"{'store':<10}{'vertices':>12}{'load (s)':>10}")
+    print(f"{'polygons':<10}{n_polygons:>12}{t_polygons:>10.2f}")
+    print(f"{'topology':<10}{n_arcs:>12}{t_topology:>10.2f}  ({n_arcs / n_polygons:.0%} of the vertices)\n")
+
+    year     = sorted(polygons["roli"]["year"].unique())[-1]
+    extents  = [("World", {})] + [(region, {"regions": [region]}) for region in wjp_regions]
+    failures = []
+    print(f"{'extent':<34}{'countries':>10}{'build poly':>12}{'build topo':>12}"
+          f"{'draw poly':>11}{'draw topo':>11}")
+    for name, extent in extents:
+        params = request_params(polygons, variable = "roli", year = year, **extent)
+        t_build_poly, renderer_poly = timed(map_renderer, params, polygons)
+        t_build_topo, renderer_topo = timed(map_renderer, params, topology)
+
+        areas_poly = renderer_poly.boundaries.area.groupby(renderer_poly.boundaries["WB_A3"]).sum()
+        areas_topo = renderer_topo.boundaries.area.groupby(renderer_topo.boundaries["WB_A3"]).sum()
+        if not np.allclose(areas_topo.reindex(areas_poly.index), areas_poly, rtol = 1e-3):
+            failures.append(name)
+
+        print(f"{name:<34}{len(renderer_topo.boundaries):>10}{t_build_poly * 1000:>10.1f}ms"
+              f"{t_build_topo * 1000:>10.1f}ms{draw_time(params, polygons, args.repeat) * 1000:>9.1f}ms"
+              f"{draw_time(params, topology, args.repeat) * 1000:>9.1f}ms")
+
+    if failures:
+        print(f"Country areas differ for: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Benchmark suite of the app: data loading, regional clipping, delta mode, color codes,
+map rendering and exports, run headlessly (Agg backend) on the files in Data/.
+
+Every case runs once to warm up and then `--repeat` times; the fastest and the median
+wall times are reported. Results can be saved as JSON and compared with a previous
+run, in which case the script exits with a non-zero status when a case got slower
+than `--max-slowdown` times its baseline:
+
+    python benchmarks/suite.py --save baseline.json
+    ... change the code ...
+    python benchmarks/suite.py --compare baseline.json
+
+The other scripts in this directory compare the current code paths with the legacy
+ones they replaced; this suite only times the current ones, to catch regressions.
+
+Usage:
+    python benchmarks/suite.py [--data-dir Data] [--repeat 3] [--filter render]
+                               [--save results.json] [--compare baseline.json]
+                               [--max-slowdown 1.25]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.colors as colors
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from src.utils.caching import LRUCache
+from src.utils.coloring import score_colors, score_hex_codes
+from src.utils.data_adds import bbox_coords
+from src.utils.data_loading import load_boundaries, load_roli
+from src.utils.geometry import MILLER, project_bbox, clip_to_bbox
+from src.utils.rendering import (
+    DEFAULT_COLORS, load_master_data, request_params, filter_scores, render_outputs
+)
+from src.utils.scores import build_change_cube, lookup_changes
+
+# Output sizes: width and height in inches, DPI
+SIZES = {
+    "small"   : (12, 8, 72),
+    "default" : (25, 16, 100),
+    "print"   : (25, 16, 200)
+}
+
+EXTENTS = {
+    "World"     : {},
+    "East Asia" : {"regions": ["East Asia and Pacific"]}
+}
+
+EXPORTS = ["map_svg", "map_svgz", "chart_svg", "table_xlsx"]
+
+
+def benchmark_cases(data_dir):
+    """Returns the cases of the suite as a list of (group, name, callable)."""
+    data   = load_master_data(data_dir, topology = True)
+    roli   = data["roli"]
+    years  = sorted(roli["year"].unique())
+    latest = years[-1]
+    cases  = []
+
+    # Loading
+    cases += [
+        ("load", "load_master_data", lambda: load_master_data(data_dir, topology = True)),
+        ("load", "boundaries", lambda: load_boundaries(data_dir)),
+        ("load", "ROLI scores", lambda: load_roli(data_dir))
+    ]
+
+    # Clipping the projected boundaries to every region of `bbox_coords`
+    boundaries = load_boundaries(data_dir).to_crs(MILLER)
+    boundaries.sindex
+    for region, *bounds in bbox_coords.itertuples(index = False):
+        bbox = project_bbox(bounds)
+        cases.append(("clip", region, lambda bbox = bbox: clip_to_bbox(boundaries, bbox)))
+
+    # Delta mode: building the percentage-change cube and slicing it for a request
+    delta_params = request_params(data, variable = "roli", year = latest, delta = True,
+                                  bins = [-1, -0.05, -0.01, 0, 0.01, 0.05, 1])
+    cases += [
+        ("delta", "build_change_cube", lambda: build_change_cube(roli)),
+        ("delta", "lookup_changes", lambda: lookup_changes(data["changes"], None, latest)),
+        ("delta", "filter_scores", lambda: filter_scores(delta_params, data))
+    ]
+
+    # Color codes of the table and face colors of the map
+    cmap = colors.LinearSegmentedColormap.from_list("default_cmap", DEFAULT_COLORS)
+    for size in (1_000, 100_000):
+        values = pd.Series(np.random.default_rng(0).random(size))
+        cases += [
+            ("colors", f"hex codes ({size:,})",
+             lambda values = values: score_hex_codes(values, cmap, 0, 1)),
+            ("colors", f"face colors ({size:,})",
+             lambda values = values: score_colors(values, cmap, 0, 1))
+        ]
+
+    # Rendering the previews of a request (map, table and chart) with warm geometries,
+    # as the app does once the extension was drawn before
+    geometries = LRUCache(max_entries = 32, max_bytes = 256 * 1024**2)
+    for extent_name, extent in EXTENTS.items():
+        for size_name, (width_in, height_in, dpi) in SIZES.items():
+            params = request_params(data, variable = "roli", year = latest, width_in = width_in,
+                                    height_in = height_in, dpi = dpi, **extent)
+            cases.append(
+                ("render", f"{extent_name} {size_name} ({width_in}x{height_in} in, {dpi} dpi)",
+                 lambda params = params: render_outputs(params, data, geometry_cache = geometries,
+                                                        exports = ()))
+            )
+
+    # Previews plus a single download, as the app renders a request
+    params = request_params(data, variable = "roli", year = latest)
+    for name in EXPORTS:
+        cases.append(
+            ("export", name,
+             lambda name = name: render_outputs(params, data, geometry_cache = geometries,
+                                                exports = (name,)))
+        )
+
+    return cases
+
+
+def run_case(func, repeat):
+    """Runs a case once to warm up, then `repeat` times. Returns the timings in seconds."""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default = os.path.join(ROOT, "Data"))
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--filter", default = None,
+                        help = "Only run the cases whose group or name match this regex")
+    parser.add_argument("--save", default = None, help = "Write the results to a JSON file")
+    parser.add_argument("--compare", default = None, help = "JSON results of a previous run")
+    parser.add_argument("--max-slowdown", type = float, default = 1.25)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r["group"], r["name"]): r for r in json.load(f)["results"]}
+
+    cases = benchmark_cases(args.data_dir)
+    if args.filter:
+        pattern = re.compile(args.filter, re.IGNORECASE)
+        cases   = [case for case in cases if pattern.search(f"{case[0]} {case[1]}")]
+
+    print(f"{'group':<8}{'case':<42}{'best (ms)':>11}{'median (ms)':>13}{'vs baseline':>13}")
+    results, regressions = [], []
+    for group, name, func in cases:
+        timings = run_case(func, args.repeat)
+        result  = {
+            "group"  : group,
+            "name"   : name,
+            "best"   : min(timings),
+            "median" : statistics.median(timings)
+        }
+        results.append(result)
+
+        ratio = ""
+        if (group, name) in baseline:
+            slowdown = result["best"] / baseline[(group, name)]["best"]
+            ratio    = f"{slowdown:.2f}x"
+            if slowdown > args.max_slowdown:
+                regressions.append(f"{group}: {name} ({ratio})")
+        print(f"{group:<8}{name[:41]:<42}{result['best'] * 1000:>11.1f}"
+              f"{result['median'] * 1000:>13.1f}{ratio:>13}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "repeat": args.repeat, "results": results}, f, indent = 2)
+
+    if regressions:
+        print(f"Slower than {args.max_slowdown}x the baseline: {'; '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Headless batch map generation.
+
+Renders every map described in a job spec with the same pipeline used by the app and
+writes the outputs (SVG, SVGZ, PNG and/or XLSX) to disk, spreading the jobs over a pool of
+worker processes that load the data once each.
+
+Usage:
+    python -m src.utils.batch_render jobs.json [--output-dir maps] [--workers 4]
+
+Job spec (JSON, or YAML when PyYAML is installed):
+    {
+        "formats"  : ["svg", "png", "xlsx"],
+        "defaults" : {"width_in": 25, "height_in": 16, "dpi": 100},
+        "matrix"   : {"variable": "all", "year": "all", "regions": ["World", "WJP"]},
+        "jobs"     : [{"variable": "roli", "year": "2024", "regions": ["South Asia"]}]
+    }
+
+Every entry of `matrix` is a list (or "all"); the job list is the product of its
+entries. In `regions`, "World" is a world map and "WJP" expands to one map per WJP
+region. Jobs accept any parameter of `rendering.DEFAULT_PARAMS`.
+
+Files are named after the variable, year and extent of the job (or its `name`). Jobs
+that would share a name get a short hash of their parameters appended.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+from src.utils.data_adds import wjp_regions
+from src.utils.data_loading import path2data
+
+FORMATS = {
+    "svg"  : "map_svg",
+    "svgz" : "map_svgz",
+    "png"  : "map_png",
+    "xlsx" : "table_xlsx"
+}
+
+# Data (and a geometry cache) loaded once by every worker process
+_data           = None
+_geometry_cache = None
+
+
+def read_spec(path):
+    """Reads a JSON or YAML job spec."""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                sys.exit("PyYAML is required to read YAML job specs. Use JSON or install pyyaml.")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def expand_jobs(spec, roli_data):
+    """Expands the matrix and the explicit jobs of a spec into a flat list of jobs."""
+    defaults = spec.get("defaults", {})
+    jobs     = [dict(defaults, **job) for job in spec.get("jobs", [])]
+
+    matrix = dict(spec.get("matrix", {}))
+    if not matrix:
+        return jobs
+
+    if matrix.get("variable", "all") == "all":
+        matrix["variable"] = roli_data.iloc[:, 4:].columns.tolist()
+    if matrix.get("year", "all") == "all":
+        matrix["year"] = sorted(roli_data["year"].unique().tolist(), reverse = True)
+
+    regions = []
+    for region in matrix.get("regions", ["World"]):
+        if region == "WJP":
+            regions.extend([[r] for r in wjp_regions])
+        elif region == "World":
+            regions.append(None)
+        else:
+            regions.append(region if isinstance(region, list) else [region])
+    matrix["regions"] = regions
+
+    keys = list(matrix)
+    for values in itertools.product(*(matrix[key] for key in keys)):
+        job = dict(defaults, **dict(zip(keys, values)))
+        if job["regions"] is None:
+            del job["regions"]
+        jobs.append(job)
+
+    return jobs
+
+
+def job_name(job):
+    """Builds a file-system friendly name for a job."""
+    extent = "-".join(job["regions"]) if job.get("regions") else job.get("extension", "World")
+    name   = job.get("name", f"{job['variable']}_{job['year']}_{extent}")
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_")
+
+
+def job_names(jobs):
+    """
+    Names every job (see `job_name`). Jobs sharing a name, such as a delta map and the
+    score map of the same variable, year and extent, get a short hash of their
+    parameters appended so that they do not overwrite each other's files.
+    """
+    from src.utils.caching import content_key
+
+    names  = [job_name(job) for job in jobs]
+    counts = Counter(names)
+    names  = [
+        f"{name}_{content_key(job)[:8]}" if counts[name] > 1 else name
+        for name, job in zip(names, jobs)
+    ]
+
+    duplicated = sorted(name for name, count in Counter(names).items() if count > 1)
+    if duplicated:
+        raise ValueError(f"Identical jobs in the spec: {', '.join(duplicated)}")
+    return names
+
+
+def init_worker(data_dir):
+    """Loads the data once per worker process."""
+    global _data, _geometry_cache
+    matplotlib.use("Agg")
+    from src.utils.caching import LRUCache
+    from src.utils.rendering import load_master_data
+    _data           = load_master_data(data_dir, topology = True)
+    _geometry_cache = LRUCache(max_entries = 16, max_bytes = 128 * 1024**2)
+
+
+def render_pool(data_dir = path2data, max_workers = None):
+    """
+    Returns a process pool whose workers have the data preloaded. The workers are
+    spawned rather than forked so they can be safely started from a threaded server.
+    """
+    return ProcessPoolExecutor(max_workers = max_workers,
+                               mp_context  = multiprocessing.get_context("spawn"),
+                               initializer = init_worker,
+                               initargs    = (data_dir,))
+
+
+def render_request(params, exports = ("map_svg", "table_xlsx", "chart_svg")):
+    """Renders a map request (previews plus `exports`) in a worker process."""
+    from src.utils.rendering import render_outputs
+    return render_outputs(params, _data, geometry_cache = _geometry_cache, exports = exports)
+
+
+def run_job(job, name, output_dir, formats):
+    """Renders a single job and writes its outputs as `name`. Returns its timing report."""
+    from src.utils.rendering import request_params
+
+    start = time.perf_counter()
+    try:
+        outputs = render_request(request_params(_data, **job),
+                                 exports = [FORMATS[fmt] for fmt in formats])
+        files   = []
+        for fmt in formats:
+            path = os.path.join(output_dir, f"{name}.{fmt}")
+            with open(path, "wb") as f:
+                f.write(outputs[FORMATS[fmt]])
+            files.append(path)
+        error = None
+    except Exception as e:
+        files, error = [], f"{type(e).__name__}: {e}"
+
+    return {
+        "name"    : name,
+        "seconds" : time.perf_counter() - start,
+        "files"   : files,
+        "error"   : error,
+        "pid"     : os.getpid()
+    }
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Render ROLI maps in batch from a job spec.")
+    parser.add_argument("spec", help = "JSON or YAML job spec")
+    parser.add_argument("--output-dir", default = "maps")
+    parser.add_argument("--data-dir", default = path2data)
+    parser.add_argument("--workers", type = int, default = os.cpu_count())
+    args = parser.parse_args(argv)
+
+    spec    = read_spec(args.spec)
+    formats = spec.get("formats", ["svg", "png", "xlsx"])
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        sys.exit(f"Unknown output formats: {', '.join(sorted(unknown))}")
+
+    from src.utils.data_loading import load_roli
+    jobs = expand_jobs(spec, load_roli(args.data_dir))
+    try:
+        names = job_names(jobs)
+    except ValueError as e:
+        sys.exit(str(e))
+    os.makedirs(args.output_dir, exist_ok = True)
+    print(f"Rendering {len(jobs)} maps with {args.workers} workers...")
+
+    start   = time.perf_counter()
+    reports = []
+    with render_pool(args.data_dir, args.workers) as pool:
+        futures = [pool.submit(run_job, job, name, args.output_dir, formats)
+                   for job, name in zip(jobs, names)]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            status = "FAILED " + report["error"] if report["error"] else "ok"
+            print(f"  {report['name']:<60}{report['seconds']:>8.2f}s  {status}")
+
+    wall   = time.perf_counter() - start
+    failed = [r for r in reports if r["error"]]
+    summary = {
+        "jobs"         : len(reports),
+        "failed"       : len(failed),
+        "wall_seconds" : wall,
+        "cpu_seconds"  : sum(r["seconds"] for r in reports),
+        "workers"      : args.workers,
+        "reports"      : sorted(reports, key = lambda r: r["name"])
+    }
+    with open(os.path.join(args.output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent = 2)
+
+    print(f"Done: {len(reports) - len(failed)} maps in {wall:.1f}s "
+          f"({summary['cpu_seconds']:.1f}s of rendering), {len(failed)} failed.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,255 +2,269 @@
 Module Name:    GeoBoundaries Cleaaning
 Author:         Carlos Alberto Toruño Paniagua
 Date:           April 6th, 2023
-Description:    This module is focused in reading and preparing the World Bank Official Boundaries  
+Description:    This module is focused in reading and preparing the World Bank Official Boundaries
                 dataset provided by the World Bank Cartography Unit for their use in the ROLI-MAP-app.
-                The CGAZ dataset can be found here: 
+                The CGAZ dataset can be found here:
                 https://datacatalog.worldbank.org/search/dataset/0038272/World-Bank-Official-Boundaries
 This version:   September 14th, 2023
+
+The build runs in stages (load -> fix codes -> split territories -> merge disputed ->
+export). Every stage saves its output as GeoParquet in WB_geodata/.stages together
+with a fingerprint of its inputs: the checksums of the source files, the fingerprint
+of the previous stage, the code of the stage itself and the tables of codes and
+places it reads (`STAGE_SETTINGS`). Stages whose fingerprint did
+not change are read back instead of being recomputed, and the export is skipped when
+its outputs are still the ones it wrote.
+
+Usage:
+    python -m src.utils.boundaries_cleaning [--force] [--source-dir Data/WB_geodata] [--output-dir Data]
 """
 
+import argparse
+import hashlib
+import inspect
+import json
 import os
-import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import geopandas as gpd
 import pandas as pd
-from shapely.geometry import box
+from shapely.geometry import box, Point
+
+from src.utils.data_loading import (
+    BOUNDARIES_STEM, boundary_files, file_checksum, write_boundary_store, boundary_store_is_valid
+)
 
 # Defining path to data files
-path2data = os.path.join(os.path.dirname(__file__), 
-                         '..', 
-                         "Data/WB_geodata/")
-
-# Loading Boundaries GeoJSON
-raw_boundaries  = (gpd
-                   .read_file(path2data + "WB_countries_Admin0.geojson"))
-raw_boundaries  = raw_boundaries[["TYPE", "WB_A3", "CONTINENT", "REGION_UN", 
-                                  "SUBREGION", "REGION_WB", "NAME_EN", "WB_NAME", 
-                                  "WB_REGION", "geometry"]]
-
-# Adjusting Dependent Territories labeled as "Country"
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "JEY", "TYPE"]    = "Dependency"  # Jersey (UK)
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "GGY", "TYPE"]    = "Dependency"  # Guernsey (UK)
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "IMY", "TYPE"]    = "Dependency"  # Isle of Man (UK)
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "SXM", "TYPE"]    = "Dependency"  # Sint Maarten (Neth.)
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "CUW", "TYPE"]    = "Dependency"  # Curaçao (Neth.)
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "ABW", "TYPE"]    = "Dependency"  # Aruba (Neth.)	
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "BES", "TYPE"]    = "Dependency"  # Saba (Neth.)
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "TKL", "TYPE"]    = "Dependency"  # Tokelau (NZ)	
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "HKG", "TYPE"]    = "Dependency"  # Hong Kong (SAR, China)
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "MAC", "TYPE"]    = "Dependency"  # Macau (SAR, China)
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "GRL", "TYPE"]    = "Dependency"  # Greenland (Den.)
-
-# Adjusting WB_A3 codes of dependent territories that have the same country code as
-# their respective sovereign country
-raw_boundaries.loc[raw_boundaries["NAME_EN"]  == "Clipperton Island", "WB_A3"]    = "FRA-OT"
-raw_boundaries.loc[raw_boundaries["WB_NAME"]  == "Navassa Island (US)", "WB_A3"]  = "USA-OT"
-
-# Converting all geometries classified as "Country" to "Sovereign country"
-raw_boundaries.loc[raw_boundaries["TYPE"] == "Country", "TYPE"]    = "Sovereign country"
-
-# Modifying the WB_A3 code for Guantanamo Bay
-raw_boundaries.loc[raw_boundaries["TYPE"]  == "Lease", "WB_A3"] = "XXX"
-
-# Adjusting Geographical allocations to match WJP's allocation
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "MEX", "SUBREGION"] = "Central America"
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "MLT", "REGION_WB"] = "Europe & Central Asia"
-
-# Adjusting Three-Letter Country Codes to match index data (ISO CODES)
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "ZAR", "WB_A3"] = "COD"   # D.R. Congo
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "KSV", "WB_A3"] = "XKX"   # Kosovo
-raw_boundaries.loc[raw_boundaries["WB_A3"] == "ROM", "WB_A3"] = "ROU"   # Romania
-
-# FIXING THE TAIWAN-CHINA ISSUE
-# Splitting China's geometries
-china    = raw_boundaries.loc[raw_boundaries["WB_A3"] == "CHN"]
-china_ex = china.explode(index_parts = True).reset_index(drop = True)
-
-# Using the area I am able to identify Taiwan as row #31
-# exploded["area_m2"] = (exploded
-#                        .to_crs("ESRI:54003")
-#                        .geometry
-#                        .area)
-# china_exsort = exploded.sort_values(by = "area_m2", 
-#                                     ascending = False)
-
-# Manually inputting Taiwan's info
-china_ex.at[31, 'WB_A3']   = "TWN"
-china_ex.at[31, 'NAME_EN'] = "Taiwan"
-china_ex.at[31, 'WB_NAME'] = "Taiwan"
-
-# Disolving exploded geopandas for China
-china = (china_ex
-         .dissolve(by      = "WB_A3",
-                   aggfunc = "first")).reset_index()
-
-# Appending china+taiwan geopandas to raw_boundaries
-raw_boundaries = (pd.concat([raw_boundaries.loc[raw_boundaries["WB_A3"] != "CHN"],
-                             china],
-                             ignore_index = True))
-
-# FIXING THE FRANCE OVERSEES TERRITORIES ISSUE
-# Splitting France's geometries
-france    = raw_boundaries.loc[raw_boundaries["WB_A3"] == "FRA"]
-france_ex = france.explode(index_parts = True).reset_index(drop = True)
+path2data   = os.path.join(os.path.dirname(__file__),
+                           "..",
+                           "..",
+                           "Data")
+path2source = os.path.join(path2data, "WB_geodata")
+
+SOURCE_FILE   = "WB_countries_Admin0.geojson"
+DISPUTED_FILE = "WB_Admin0_disputed_areas.geojson"
+STAGES_DIR    = ".stages"
+COLUMNS       = ["TYPE", "WB_A3", "CONTINENT", "REGION_UN", "SUBREGION", "REGION_WB",
+                 "NAME_EN", "WB_NAME", "WB_REGION", "geometry"]
+
+# Dependent Territories labeled as "Country"
+DEPENDENCIES = [
+    "JEY",  # Jersey (UK)
+    "GGY",  # Guernsey (UK)
+    "IMY",  # Isle of Man (UK)
+    "SXM",  # Sint Maarten (Neth.)
+    "CUW",  # Curaçao (Neth.)
+    "ABW",  # Aruba (Neth.)
+    "BES",  # Saba (Neth.)
+    "TKL",  # Tokelau (NZ)
+    "HKG",  # Hong Kong (SAR, China)
+    "MAC",  # Macau (SAR, China)
+    "GRL"   # Greenland (Den.)
+]
+
+# Dependent territories that have the same country code as their sovereign country
+TERRITORY_CODES = {
+    ("NAME_EN", "Clipperton Island")   : "FRA-OT",
+    ("WB_NAME", "Navassa Island (US)") : "USA-OT"
+}
+
+# Geographical allocations adjusted to match WJP's allocation
+ALLOCATIONS = {
+    ("MEX", "SUBREGION") : "Central America",
+    ("MLT", "REGION_WB") : "Europe & Central Asia"
+}
+
+# Three-Letter Country Codes adjusted to match index data (ISO CODES)
+ISO_CODES = {
+    "ZAR" : "COD",  # D.R. Congo
+    "KSV" : "XKX",  # Kosovo
+    "ROM" : "ROU"   # Romania
+}
+
+# Taiwan is the part of China's geometries holding Taipei
+TAIPEI = Point(121.56, 25.04)
 
 # Continental France bounding box
 FRbox  = box(-16.4, 34, 23, 52.5)
 
-# Define a function to check if the feature's geometry falls within FRA bounding box
-def location_checker(row):
-    if row.geometry.within(FRbox):
-        return "France"
-    else:
-        return "France Oversees Territories"
-
-# Adjusting info of the Oversees Territories
-france_ex["WB_NAME"] = france_ex.apply(location_checker, axis=1)
-france_ex.loc[france_ex["WB_NAME"] == "France Oversees Territories", "TYPE"]  = "Dependency"
-france_ex.loc[france_ex["WB_NAME"] == "France Oversees Territories", "WB_A3"] = "FRA-OT"
-france_ex.loc[france_ex["WB_NAME"] == "France Oversees Territories", "REGION_UN"] = "Other"
-france_ex.loc[france_ex["WB_NAME"] == "France Oversees Territories", "SUBREGION"] = "Other"
-
-# Disolving exploded geopandas for France
-france = (france_ex
-          .dissolve(by      = "WB_A3",
-                    aggfunc = "first")).reset_index()
-
-# Appending china+taiwan geopandas to raw_boundaries
-raw_boundaries = (pd.concat([raw_boundaries.loc[raw_boundaries["WB_A3"] != "FRA"],
-                             france],
-                             ignore_index = True))
-
-# Loading Disputed Territories GeoJSON
-disputed_territories = (gpd
-                        .read_file(path2data + "WB_Admin0_disputed_areas.geojson")
-                        .drop(6)
-                        .assign(TYPE="Disputed"))
-disputed_territories = disputed_territories[["TYPE", "WB_A3", "CONTINENT", 
-                                             "REGION_UN", "SUBREGION", "REGION_WB", 
-                                             "NAME_EN", "WB_NAME", "WB_REGION", 
-                                             "geometry"]]
-disputed_territories["WB_grouped_A3"] = disputed_territories["WB_A3"]
-
-# The following steps were needed when using the GeoBoundaries data. However,
-# Now that we are using the World Bank Data, these steps are not required anymore.
-
-# Simplify polygons with a tolerance of 0.01
-# simplified_boundaries = boundaries_adt.simplify(tolerance = 0.01, 
-#                                                 preserve_topology = True)
-
-# Replacing old and accurate geometries for simplified ones
-# gboundaries = gpd.GeoDataFrame(raw_boundaries.drop(columns = ['geometry']), 
-#                                geometry = simplified_boundaries, 
-#                                crs = raw_boundaries.crs)
-
-# Filtering Antarctica and those polygons without a shapeGroup value
-# filtered_boundaries = gboundaries.query("shapeGroup != 'ATA' and not(shapeGroup.isna())")
-
-# Defining a function to group dependencies to their "Parent State"
-def group_dependencies(row):
-    code = row["WB_A3"]
-    if code in ["ASM", "UMI", "GUM", "MNP", "PRI", "VIR"]:
-        return "USA"
-    elif code in ["AIA", "BMU", "IOT", "VGB", "CYM", "FLK", "GIB", "GGY", 
-                  "IMY", "JEY", "MSR", "PCN", "SHN", "SGS", "TCA"]:
-        return "GBR"
-    elif code in ["ABW", "BES", "CUW", "SXM"]:
-        return "NLD"
-    elif code in ["PYF", "ATF", "NCL", "BLM", "MAF", "SPM", "WLF"]:
-        return "FRA"
-    elif code in ["CXR", "CCK", "HMD", "NFK"]:
-        return "AUS"
-    elif code in ["COK", "NIU", "TKL"]:
-        return "NZL"
-    elif code in ["FRO"]: # Greenland "GRL" stays as a separate territory
-        return "DNK"
-    # elif code in ["HKG", "MAC"]:
-    #     return "CHN"
-    else:
-        return row["WB_A3"]
-
-# THE FOLLOWING STEPS ARE NO LONGER NEEDED!!!
-# DEPENDENCIES ARE LEFT AS SEPARATE GEOMETRIES
-
-# Creating a grouped WB code
-# raw_boundaries["WB_grouped_A3"] = raw_boundaries.apply(group_dependencies, 
-#                                                        axis = 1)
-
-# Transforming variables from all DEPENDENCY territories to NaN
-# raw_boundaries.loc[raw_boundaries["TYPE"] == "Dependency", 
-#                    ~(raw_boundaries
-#                      .columns
-#                      .isin(["WB_grouped_A3", "geometry"]))] = np.nan
-
-# Dissolving the geo data frame
-# raw_boundaries = (raw_boundaries
-#                   .dissolve(by      = "WB_grouped_A3",
-#                             aggfunc = "first")).reset_index()
-
-# Unifying TYPE == COUNTRY
-# raw_boundaries.loc[raw_boundaries["TYPE"] == "Sovereign country", "TYPE"] = "Country"
-
-# Concatenating boundaries with disputed territories
-boundaries = pd.concat([raw_boundaries, disputed_territories])
-boundaries = boundaries.drop(["WB_grouped_A3", "CONTINENT", "WB_REGION", "NAME_EN"], 
-                             axis = 1)
-
-# THE FOLLOWING STEPS ARE NO LONGER NEEDED!!!
-# NO MORE SPECIAL BORDERS
-
-# ## DEFINING SPECIAL BORDERS
-# ## Sudan - South Sudan
-# sudan       = boundaries[boundaries["WB_A3"] == "SDN"].iloc[0].geometry
-# south_sudan = boundaries[boundaries["WB_A3"] == "SSD"].iloc[0].geometry
-# sudan.touches(south_sudan)
-# sudan_border = sudan.intersection(south_sudan)
-
-# ## Ethiopia - Somalia
-# ethiopia = boundaries[boundaries["WB_A3"] == "ETH"].iloc[0].geometry
-# somalia  = boundaries[boundaries["WB_A3"] == "SOM"].iloc[0].geometry 
-# ethiopia.touches(somalia)
-# etsom_border = ethiopia.intersection(somalia)
-
-# ## Kosovo - Serbia
-# kosovo = boundaries[boundaries["WB_A3"] == "XKX"].iloc[0].geometry
-# serbia = boundaries[boundaries["WB_A3"] == "SRB"].iloc[0].geometry
-# kosovo.touches(serbia)
-# koser_border = kosovo.intersection(serbia)
-
-# ## South - North Korea
-# skorea = boundaries[boundaries["WB_A3"] == "KOR"].iloc[0].geometry
-# nkorea = boundaries[boundaries["WB_A3"] == "PRK"].iloc[0].geometry
-# skorea.touches(nkorea)
-# korea_border = skorea.intersection(nkorea)
-
-# ## Creating geopandas dataframe with special borders
-# bnames = ["Sudan - South Sudan",
-#           "Ethiopia - Somalia",
-#           "Kosovo - Serbia",
-#           "Korea"]
-# types = "Special Border"
-# geometries = [sudan_border, 
-#               etsom_border,
-#               koser_border,
-#               korea_border]
-# dictionary = {"TYPE": "Special Border",
-#               "WB_NAME": bnames, 
-#               "geometry": geometries}
-# sborders   = gpd.GeoDataFrame(dictionary, geometry = geometries)
-
-# # Creating extended bounndaries
-# boundaries_extended = pd.concat([boundaries, sborders])
-
-# Save the updated GeoJSON to a file
-path4saving = os.path.join(os.path.dirname(__file__), 
-                           '..',
-                           "Data")
-boundaries.to_file(path4saving + "/data4app.geojson", 
-                   driver="GeoJSON")
-# boundaries_extended.to_file(path4saving + "/data4app.geojson", 
-#                             driver="GeoJSON")
-
-# Converting data to a Pandas DataFrame and saving it as CSV
-(pd
- .DataFrame(boundaries.drop(columns="geometry"))
- .to_csv(path4saving + "/data4app.csv"))
\ No newline at end of file
+# Module-level settings read by every stage, hashed into its fingerprint so that
+# editing them rebuilds the stage
+STAGE_SETTINGS = {
+    "load"              : {"columns": COLUMNS},
+    "fix_codes"         : {
+        "dependencies"    : DEPENDENCIES,
+        "territory_codes" : list(TERRITORY_CODES.items()),
+        "allocations"     : list(ALLOCATIONS.items()),
+        "iso_codes"       : ISO_CODES
+    },
+    "split_territories" : {"taipei": TAIPEI.wkt, "france_box": FRbox.wkt},
+    "merge_disputed"    : {"columns": COLUMNS}
+}
+
+
+def stage_fingerprint(func, settings, *inputs):
+    """Hashes the code and the settings of a stage together with the fingerprints of its inputs."""
+    digest = hashlib.sha256(inspect.getsource(func).encode("utf-8"))
+    digest.update(json.dumps(settings, sort_keys = True).encode("utf-8"))
+    for value in inputs:
+        digest.update(str(value).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def run_stage(name, func, inputs, stages_dir, force = False):
+    """
+    Returns the fingerprint and the output of a stage. `inputs` is a list of
+    (fingerprint, value) pairs: the values are passed to `func` and the fingerprints
+    identify them, together with the `STAGE_SETTINGS` of the stage. The output is read
+    from `stages_dir` when the fingerprint matches.
+    """
+    fingerprint   = stage_fingerprint(func, STAGE_SETTINGS.get(name), *(fp for fp, _ in inputs))
+    parquet_path  = os.path.join(stages_dir, f"{name}.parquet")
+    manifest_path = os.path.join(stages_dir, f"{name}.json")
+
+    if not force and os.path.exists(parquet_path) and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f)["fingerprint"] == fingerprint:
+                print(f"{name:<20}skipped (unchanged)")
+                return fingerprint, gpd.read_parquet(parquet_path)
+
+    start  = time.perf_counter()
+    output = func(*(value for _, value in inputs))
+    output.reset_index(drop = True).to_parquet(parquet_path, compression = "zstd")
+    with open(manifest_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "features": len(output)}, f, indent = 2)
+    print(f"{name:<20}{time.perf_counter() - start:.2f}s")
+    return fingerprint, output
+
+
+def load_source(source_path):
+    """Reads the World Bank boundaries, keeping the columns used by the app."""
+    return gpd.read_file(source_path, columns = COLUMNS[:-1])[COLUMNS]
+
+
+def fix_codes(raw_boundaries):
+    """Adjusts the types, codes and regions of the boundaries."""
+    raw_boundaries = raw_boundaries.copy()
+    codes          = raw_boundaries["WB_A3"]
+
+    raw_boundaries.loc[codes.isin(DEPENDENCIES), "TYPE"] = "Dependency"
+    for (column, name), code in TERRITORY_CODES.items():
+        raw_boundaries.loc[raw_boundaries[column] == name, "WB_A3"] = code
+
+    # Converting all geometries classified as "Country" to "Sovereign country"
+    raw_boundaries["TYPE"] = raw_boundaries["TYPE"].replace("Country", "Sovereign country")
+
+    # Modifying the WB_A3 code for Guantanamo Bay
+    raw_boundaries.loc[raw_boundaries["TYPE"] == "Lease", "WB_A3"] = "XXX"
+
+    for (code, column), value in ALLOCATIONS.items():
+        raw_boundaries.loc[raw_boundaries["WB_A3"] == code, column] = value
+
+    raw_boundaries["WB_A3"] = raw_boundaries["WB_A3"].replace(ISO_CODES)
+    return raw_boundaries
+
+
+def split_territories(raw_boundaries):
+    """Splits Taiwan from China and France's overseas territories from France."""
+    # FIXING THE TAIWAN-CHINA ISSUE
+    china_ex = raw_boundaries.loc[raw_boundaries["WB_A3"] == "CHN"].explode(ignore_index = True)
+    china_ex.loc[china_ex.contains(TAIPEI), ["WB_A3", "NAME_EN", "WB_NAME"]] = [
+        "TWN", "Taiwan", "Taiwan"
+    ]
+    china = china_ex.dissolve(by = "WB_A3", aggfunc = "first").reset_index()
+    raw_boundaries = pd.concat([raw_boundaries.loc[raw_boundaries["WB_A3"] != "CHN"], china],
+                               ignore_index = True)
+
+    # FIXING THE FRANCE OVERSEES TERRITORIES ISSUE
+    # Parts outside the bounding box of continental France are overseas territories
+    france_ex = raw_boundaries.loc[raw_boundaries["WB_A3"] == "FRA"].explode(ignore_index = True)
+    france_ex["WB_NAME"] = "France"
+    france_ex.loc[~france_ex.within(FRbox), ["WB_NAME", "TYPE", "WB_A3", "REGION_UN", "SUBREGION"]] = [
+        "France Oversees Territories", "Dependency", "FRA-OT", "Other", "Other"
+    ]
+    france = france_ex.dissolve(by = "WB_A3", aggfunc = "first").reset_index()
+    return pd.concat([raw_boundaries.loc[raw_boundaries["WB_A3"] != "FRA"], france],
+                     ignore_index = True)
+
+
+def merge_disputed(raw_boundaries, disputed_path):
+    """Appends the disputed territories and keeps the columns used by the app."""
+    disputed_territories = (
+        gpd.read_file(disputed_path)
+        .drop(6)
+        .assign(TYPE = "Disputed")
+    )[COLUMNS]
+
+    boundaries = pd.concat([raw_boundaries, disputed_territories])
+    return boundaries.drop(["CONTINENT", "WB_REGION", "NAME_EN"], axis = 1)
+
+
+def export_boundaries(boundaries, output_dir, fingerprint, stages_dir, force = False):
+    """
+    Writes the GeoJSON, its GeoParquet store and the CSV of attributes in parallel.
+    Skipped when the outputs are still the ones written for `fingerprint`.
+    """
+    geojson_file, _, _ = boundary_files(BOUNDARIES_STEM)
+    geojson_path  = os.path.join(output_dir, geojson_file)
+    csv_path      = os.path.join(output_dir, f"{BOUNDARIES_STEM}.csv")
+    manifest_path = os.path.join(stages_dir, "export.json")
+
+    if not force and os.path.exists(manifest_path) and os.path.exists(csv_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if (manifest["fingerprint"] == fingerprint and boundary_store_is_valid(output_dir)
+                and manifest["csv_sha256"] == file_checksum(csv_path)):
+            print(f"{'export':<20}skipped (unchanged)")
+            return
+
+    start      = time.perf_counter()
+    boundaries = boundaries.reset_index(drop = True)
+    with ThreadPoolExecutor(max_workers = 2) as pool:
+        csv     = pool.submit(
+            lambda: pd.DataFrame(boundaries.drop(columns = "geometry")).to_csv(csv_path)
+        )
+        # The GeoParquet manifest holds the checksum of the GeoJSON, so it comes last
+        geojson = pool.submit(
+            lambda: (boundaries.to_file(geojson_path, driver = "GeoJSON"),
+                     write_boundary_store(boundaries, output_dir))
+        )
+        csv.result()
+        geojson.result()
+
+    with open(manifest_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "csv_sha256": file_checksum(csv_path)}, f, indent = 2)
+    print(f"{'export':<20}{time.perf_counter() - start:.2f}s")
+
+
+def build_boundaries(source_dir = path2source, output_dir = path2data, force = False):
+    """Runs the stages of the build, skipping the ones whose inputs did not change."""
+    stages_dir    = os.path.join(source_dir, STAGES_DIR)
+    source_path   = os.path.join(source_dir, SOURCE_FILE)
+    disputed_path = os.path.join(source_dir, DISPUTED_FILE)
+    os.makedirs(stages_dir, exist_ok = True)
+
+    loaded = run_stage("load", load_source,
+                       [(file_checksum(source_path), source_path)], stages_dir, force)
+    fixed  = run_stage("fix_codes", fix_codes, [loaded], stages_dir, force)
+    split  = run_stage("split_territories", split_territories, [fixed], stages_dir, force)
+    merged = run_stage("merge_disputed", merge_disputed,
+                       [split, (file_checksum(disputed_path), disputed_path)], stages_dir, force)
+
+    fingerprint, boundaries = merged
+    export_boundaries(boundaries, output_dir, fingerprint, stages_dir, force)
+    return boundaries
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Build the boundaries used by the app.")
+    parser.add_argument("--source-dir", default = path2source)
+    parser.add_argument("--output-dir", default = path2data)
+    parser.add_argument("--force", action = "store_true", help = "Rebuild every stage")
+    args = parser.parse_args(argv)
+    build_boundaries(args.source_dir, args.output_dir, args.force)
+
+
+if __name__ == "__main__":
+    main()
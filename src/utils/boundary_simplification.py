@@ -1,114 +1,202 @@
+"""
+Builds the simplified boundaries (levels of detail) used by the app.
+
+The boundaries are converted to a TopoJSON topology once, so that shared borders are
+simplified only once and neighbouring countries stay aligned. The topology is then
+simplified with every combination of algorithm (Visvalingam-Whyatt, Douglas-Peucker)
+and tolerance in a process pool, and every result is measured: number of vertices,
+size of the TopoJSON and GeoParquet files, Hausdorff distance to the original
+boundaries of every country and build time. The measurements are saved as
+simplification_report.csv (one row per algorithm and tolerance) and
+simplification_hausdorff.csv (one row per country).
+
+The levels simplified with `LOD_ALGORITHM` are saved as the LOD store of the app
+(see `data_loading.write_lod_store`) together with their TopoJSON, and the vector
+tiles of the web map are built from them.
+
+Usage:
+    python -m src.utils.boundary_simplification [--algorithms vw dp] [--workers 4] [--previews]
+"""
+
+import argparse
+import importlib.util
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
 import topojson as tp
-import os
-from matplotlib import pyplot as plt
 
-path4saving = os.path.join(os.path.dirname(__file__), 
-                           '..',
+from src.utils.data_loading import LOD_DIR, LOD_TOPOJSON, BOUNDARIES_GEOJSON, write_lod_store
+from src.utils.tiles import build_tiles
+
+path4saving = os.path.join(os.path.dirname(__file__),
+                           "..",
+                           "..",
                            "Data")
 
-# Reading data
-boundaries = gpd.read_file(path4saving + "/data4app.geojson")
-
-# Convert the GeoDataFrame to a TopoJSON format
-topojson_data = tp.Topology(boundaries,
-                            prequantize = 1000000)
-
-# Saving as TOPOJSON
-topojson_data.to_json(path4saving + "/Simplified files/WJPboundaries.topojson")
-
-# Set your tolerance in degrees
-tolerance_degrees_10m  = 0.000090  # Approximately 10 meters in degrees
-tolerance_degrees_30m  = 0.000245  # Approximately 25 meters in degrees
-tolerance_degrees_50m  = 0.000350  # Approximately 40 meters in degrees
-tolerance_degrees_100m = 0.001    # Approximately 75 meters in degrees
-
-# Simplify the TopoJSON geometries with specified tolerances in degrees
-topojson_simplified_10m = topojson_data.toposimplify(
-    epsilon = tolerance_degrees_10m, 
-    simplify_algorithm   = 'vw', 
-    simplify_with        = 'simplification', 
-    prevent_oversimplify = True
-)
-
-topojson_simplified_30m = topojson_data.toposimplify(
-    epsilon = tolerance_degrees_30m, 
-    simplify_algorithm   = 'vw', 
-    simplify_with        = 'simplification', 
-    prevent_oversimplify = True
-)
-
-topojson_simplified_50m = topojson_data.toposimplify(
-    epsilon = tolerance_degrees_50m, 
-    simplify_algorithm   = 'vw', 
-    simplify_with        = 'simplification', 
-    prevent_oversimplify = True
-)
-
-topojson_simplified_100m = topojson_data.toposimplify(
-    epsilon = tolerance_degrees_100m, 
-    simplify_algorithm   = 'vw', 
-    simplify_with        = 'simplification', 
-    prevent_oversimplify = True
-)
-
-# Convert the simplified TopoJSON back to GeoDataFrame
-simplified_gdf_10m  = topojson_simplified_10m.to_gdf()
-simplified_gdf_30m  = topojson_simplified_30m.to_gdf()
-simplified_gdf_50m  = topojson_simplified_50m.to_gdf()
-simplified_gdf_100m = topojson_simplified_100m.to_gdf()
-
-# Saving geodataframes
-# simplified_gdf_10m.to_file(path4saving + "/Simplified files/simplified_gdf_10m.geojson", 
-#                            driver="GeoJSON")
-
-
-topojson_simplified_10m.to_json(path4saving + "/Simplified files/simplified_gdf_10m.topojson")
-topojson_simplified_30m.to_json(path4saving + "/Simplified files/simplified_gdf_30m.topojson")
-topojson_simplified_50m.to_json(path4saving + "/Simplified files/simplified_gdf_50m.topojson")
-topojson_simplified_100m.to_json(path4saving + "/Simplified files/simplified_gdf_100m.topojson")
-
-# Visualizing simplified versions
-simplified_gdf_10m.plot(color     = "orange", 
-                        edgecolor = "#EBEBEB",
-                        linewidth = 0.25)
-plt.title('Simplified geometries: Precision 10m')
-plt.xlabel('Longitude')
-plt.ylabel('Latitude')
-plt.savefig(path4saving + "/Simplified files/boundaries10m.png", 
-            dpi=300, bbox_inches='tight')
-
-
-simplified_gdf_30m.plot(color     = "orange", 
-                        edgecolor = "#EBEBEB",
-                        linewidth = 0.25)
-plt.title('Simplified geometries: Precision 30m')
-plt.xlabel('Longitude')
-plt.ylabel('Latitude')
-plt.savefig(path4saving + "/Simplified files/boundaries30m.png", 
-            dpi=300, bbox_inches='tight')
-
-
-simplified_gdf_50m.plot(color     = "orange", 
-                        edgecolor = "#EBEBEB",
-                        linewidth = 0.25)
-plt.title('Simplified geometries: Precision 50m')
-plt.xlabel('Longitude')
-plt.ylabel('Latitude')
-plt.savefig(path4saving + "/Simplified files/boundaries50m.png", 
-            dpi=300, bbox_inches='tight')
-
-
-simplified_gdf_100m.plot(color     = "orange", 
-                        edgecolor = "#EBEBEB",
-                        linewidth = 0.25)
-plt.title('Simplified geometries: Precision 100m')
-plt.xlabel('Longitude')
-plt.ylabel('Latitude')
-plt.savefig(path4saving + "/Simplified files/boundaries100m.png", 
-            dpi=300, bbox_inches='tight')
-
-
-
-
-boundaries = gpd.read_file("/Users/ctoruno/Documents/WJP_boundaries_10.json")
+# Tolerances in degrees
+TOLERANCES = {
+    "10m"  : 0.000090,  # Approximately 10 meters in degrees
+    "30m"  : 0.000245,  # Approximately 25 meters in degrees
+    "50m"  : 0.000350,  # Approximately 40 meters in degrees
+    "100m" : 0.001      # Approximately 75 meters in degrees
+}
+ALGORITHMS    = ["vw", "dp"]
+LOD_ALGORITHM = "vw"
+METERS_PER_DEGREE = 111_320
+
+# Topology and original geometries, sent once to every worker process
+_topology   = None
+_geometries = None
+
+
+def has_vw():
+    """Visvalingam-Whyatt needs the optional `simplification` package."""
+    return importlib.util.find_spec("simplification") is not None
+
+
+def init_worker(topology, geometries):
+    global _topology, _geometries
+    _topology, _geometries = topology, geometries
+
+
+def file_size(write, suffix):
+    """Returns the size in bytes of the file written by `write(path)`."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"layer{suffix}")
+        write(path)
+        return os.path.getsize(path)
+
+
+def simplify_level(algorithm, name, tolerance, lod_dir = None, preview_dir = None):
+    """
+    Simplifies the topology of the worker and measures the result. When `lod_dir` is
+    given, the simplified TopoJSON is written there as a level of the LOD store.
+    Returns the summary row, the Hausdorff distance of every country and the layer.
+    """
+    start      = time.perf_counter()
+    simplified = _topology.toposimplify(
+        epsilon              = tolerance,
+        simplify_algorithm   = algorithm,
+        simplify_with        = "simplification" if algorithm == "vw" else "shapely",
+        prevent_oversimplify = True
+    )
+    layer   = simplified.to_gdf()
+    seconds = time.perf_counter() - start
+
+    if lod_dir is not None:
+        simplified.to_json(os.path.join(lod_dir, LOD_TOPOJSON.format(name = name)))
+
+    # Features keep the order of the boundaries they were built from
+    hausdorff = shapely.hausdorff_distance(_geometries, layer.geometry.values)
+    vertices  = shapely.get_num_coordinates(layer.geometry.values).sum()
+    original  = shapely.get_num_coordinates(_geometries).sum()
+
+    if preview_dir is not None:
+        from matplotlib.figure import Figure
+        preview = Figure()
+        ax      = preview.subplots()
+        layer.plot(ax = ax, color = "orange", edgecolor = "#EBEBEB", linewidth = 0.25)
+        ax.set_title(f"Simplified geometries: {algorithm.upper()} {name}")
+        ax.set_xlabel("Longitude")
+        ax.set_ylabel("Latitude")
+        preview.savefig(os.path.join(preview_dir, f"boundaries_{algorithm}_{name}.png"),
+                        dpi = 300, bbox_inches = "tight")
+
+    summary = {
+        "algorithm"      : algorithm,
+        "level"          : name,
+        "tolerance"      : tolerance,
+        "vertices"       : int(vertices),
+        "vertices_kept"  : vertices / original,
+        "topojson_bytes" : file_size(simplified.to_json, ".topojson"),
+        "parquet_bytes"  : file_size(lambda path: layer.to_parquet(path, compression = "zstd"),
+                                     ".parquet"),
+        "hausdorff_max"  : np.nanmax(hausdorff) * METERS_PER_DEGREE,
+        "hausdorff_p95"  : np.nanpercentile(hausdorff, 95) * METERS_PER_DEGREE,
+        "hausdorff_mean" : np.nanmean(hausdorff) * METERS_PER_DEGREE,
+        "seconds"        : seconds
+    }
+    errors = pd.DataFrame({
+        "algorithm"   : algorithm,
+        "level"       : name,
+        "WB_A3"       : layer["WB_A3"].values,
+        "hausdorff_m" : hausdorff * METERS_PER_DEGREE
+    })
+    return summary, errors, layer
+
+
+def build_lods(data_dir = path4saving, algorithms = ALGORITHMS, workers = None, previews = False):
+    """
+    Runs the simplification sweep and writes the report, the LOD store and the tiles.
+    Returns the report table.
+    """
+    lod_dir    = os.path.join(data_dir, LOD_DIR)
+    boundaries = gpd.read_file(os.path.join(data_dir, BOUNDARIES_GEOJSON))
+    os.makedirs(lod_dir, exist_ok = True)
+
+    if "vw" in algorithms and not has_vw():
+        print("The `simplification` package is not installed: skipping Visvalingam-Whyatt.")
+        algorithms = [algorithm for algorithm in algorithms if algorithm != "vw"]
+    lod_algorithm = LOD_ALGORITHM if LOD_ALGORITHM in algorithms else algorithms[0]
+
+    # Convert the GeoDataFrame to a TopoJSON format and save it
+    topology = tp.Topology(boundaries, prequantize = 1000000)
+    topology.to_json(os.path.join(lod_dir, "WJPboundaries.topojson"))
+
+    sweep = [(algorithm, name, tolerance)
+             for algorithm in algorithms for name, tolerance in TOLERANCES.items()]
+    with ProcessPoolExecutor(max_workers = workers,
+                             initializer = init_worker,
+                             initargs    = (topology, boundaries.geometry.values)) as pool:
+        futures = [
+            pool.submit(simplify_level, algorithm, name, tolerance,
+                        lod_dir if algorithm == lod_algorithm else None,
+                        lod_dir if previews else None)
+            for algorithm, name, tolerance in sweep
+        ]
+        results = [future.result() for future in futures]
+
+    report = pd.DataFrame([summary for summary, _, _ in results])
+    report.to_csv(os.path.join(lod_dir, "simplification_report.csv"), index = False)
+    pd.concat([errors for _, errors, _ in results]).to_csv(
+        os.path.join(lod_dir, "simplification_hausdorff.csv"), index = False
+    )
+
+    # Saving the level-of-detail layers that the app picks from, depending on the map
+    # extension and the output size
+    lod_levels = write_lod_store(
+        {
+            name: (tolerance, layer)
+            for (algorithm, name, tolerance), (_, _, layer) in zip(sweep, results)
+            if algorithm == lod_algorithm
+        },
+        data_dir
+    )
+
+    # Building the vector tiles of the interactive web map (served from ./static/tiles)
+    build_tiles(boundaries, lod_levels, data_dir)
+    return report
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Build the simplified boundaries of the app.")
+    parser.add_argument("--data-dir", default = path4saving)
+    parser.add_argument("--algorithms", nargs = "+", choices = ALGORITHMS, default = ALGORITHMS)
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--previews", action = "store_true",
+                        help = "Save a 300-DPI preview of every simplified layer")
+    args = parser.parse_args(argv)
+
+    report = build_lods(args.data_dir, args.algorithms, args.workers, args.previews)
+    with pd.option_context("display.width", 160, "display.float_format", "{:.6g}".format):
+        print(report.to_string(index = False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+In-memory caches shared by all the sessions of a Streamlit worker.
+
+Streamlit's own caches bound the number of entries but not their size, and they hash
+every argument of the cached function. The cache defined here is keyed by small,
+normalized keys built by the caller, and it is bounded both by number of entries and by
+an estimate of the memory held by its values.
+
+Data shared by every session without copies (such as the master data) is frozen with
+`freeze()`, so that code writing into it fails instead of changing it for all users.
+"""
+
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+import numpy as np
+import shapely
+
+
+def content_key(params):
+    """Returns a canonical SHA-256 key for a JSON-serializable dictionary of parameters."""
+    canonical = json.dumps(params, sort_keys = True, separators = (",", ":"), default = str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def frame_nbytes(frame):
+    """Estimates the memory held by a (Geo)DataFrame, including its geometries."""
+    if hasattr(frame, "geometry"):
+        attributes = frame.drop(columns = frame.geometry.name)
+        ncoords    = shapely.get_num_coordinates(frame.geometry.to_numpy()).sum()
+        return int(attributes.memory_usage(deep = True).sum() + ncoords * 16 + len(frame) * 64)
+    # Series report a single number, DataFrames one per column
+    return int(np.sum(frame.memory_usage(deep = True)))
+
+
+def value_nbytes(value):
+    """Estimates the memory held by a cached value."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, "memory_usage"):
+        return frame_nbytes(value)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(value_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(value_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _freeze_frame(frame):
+    for block in frame._mgr.blocks:
+        # Geometry columns keep their shapely objects in a numpy array of their own
+        values = getattr(block.values, "_data", block.values)
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+
+
+def freeze(value):
+    """
+    Makes shared data read-only in place: the numpy arrays and the columns of the frames
+    it holds cannot be written to, and dictionaries are returned as read-only mappings.
+    Objects holding arrays (such as a `Topology`) have their array attributes frozen.
+    Replacing a whole column of a frame is still possible and must be avoided.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif hasattr(value, "_mgr"):
+        _freeze_frame(value)
+    elif hasattr(value, "__dict__"):
+        for item in vars(value).values():
+            if isinstance(item, np.ndarray) or hasattr(item, "_mgr"):
+                freeze(item)
+    return value
+
+
+class LRUCache:
+    """A thread-safe LRU cache bounded by number of entries and by total size in bytes."""
+
+    def __init__(self, max_entries, max_bytes, sizeof = value_nbytes):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.sizeof      = sizeof
+        self.nbytes      = 0
+        self.hits        = 0
+        self.misses      = 0
+        self.evictions   = 0
+        self._entries    = OrderedDict()
+        self._lock       = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default = None):
+        """Returns the cached value for `key`, marking it as the most recently used."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        """Stores `value` under `key` and evicts the least recently used entries if needed."""
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self.nbytes       += size
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last = False)
+                self.nbytes    -= evicted_size
+                self.evictions += 1
+        return value
+
+    def get_or_create(self, key, factory):
+        """Returns the cached value for `key`, building it with `factory()` on a miss."""
+        sentinel = object()
+        value    = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, factory())
+        return value
+
+    def clear(self):
+        """Drops every entry and resets the size accounting."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Returns the hit/miss counters and the current size of the cache."""
+        return {
+            "entries"     : len(self._entries),
+            "max_entries" : self.max_entries,
+            "nbytes"      : self.nbytes,
+            "max_bytes"   : self.max_bytes,
+            "hits"        : self.hits,
+            "misses"      : self.misses,
+            "evictions"   : self.evictions
+        }
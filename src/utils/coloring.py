@@ -0,0 +1,48 @@
+"""
+Color helpers shared by the map, the outcome table and the bar chart.
+
+Scores are normalized against the floor and ceiling selected by the user and the
+colormap is evaluated once over the whole column, so every output built from these
+helpers gets exactly the same colors.
+"""
+
+import numpy as np
+import matplotlib.colors as colors
+
+MISSING_COLOR = "#EBEBEB"
+
+_HEX_PAIRS = np.array([f"{i:02x}" for i in range(256)])
+
+
+def score_colors(values, cmap, floor, ceiling, alpha = None):
+    """
+    Returns an (n, 4) RGBA array with the color of each score. Missing scores get the
+    missing-values color and are always opaque.
+    """
+    values  = np.asarray(values, dtype = float)
+    norm    = colors.Normalize(vmin = floor, vmax = ceiling)
+    rgba    = cmap(norm(values))
+    missing = np.isnan(values)
+
+    if alpha is not None:
+        rgba[:, 3] = np.broadcast_to(np.asarray(alpha, dtype = float), values.shape)
+
+    rgba[missing] = colors.to_rgba(MISSING_COLOR)
+    return rgba
+
+
+def rgba2hex(rgba, alpha = False):
+    """
+    Converts an (n, 4) RGBA array to an array of hex codes, as `colors.rgb2hex` does
+    (or `colors.to_hex(..., keep_alpha = True)` when `alpha` is True).
+    """
+    channels = np.round(np.asarray(rgba)[:, :4 if alpha else 3] * 255).astype(np.uint8)
+    codes    = np.full(len(channels), "#")
+    for channel in channels.T:
+        codes = np.char.add(codes, _HEX_PAIRS[channel])
+    return codes
+
+
+def score_hex_codes(values, cmap, floor, ceiling):
+    """Returns the hex color code of each score."""
+    return rgba2hex(score_colors(values, cmap, floor, ceiling))
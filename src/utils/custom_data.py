@@ -0,0 +1,112 @@
+"""
+Ingestion of the custom data uploaded to the app.
+
+Uploads may be XLSX, CSV or Parquet files with one row per country and year: the
+`COUNTRY`, `CODE` and `YEAR` columns plus one column per variable. Only the header is
+read to list the variables, and only the id columns and the selected variable are read
+afterwards (CSV files in chunks), so large files with many columns or subnational rows
+do not have to be parsed whole.
+
+The codes are checked against the `WB_A3` codes of the boundaries in one pass. Rows
+whose code has no boundary can never be drawn, so they are dropped and reported.
+"""
+
+import io
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+CUSTOM_FORMATS  = ["xlsx", "csv", "parquet"]
+CUSTOM_COLUMNS  = {
+    "COUNTRY" : "country",
+    "CODE"    : "code",
+    "YEAR"    : "year"
+}
+MAX_UPLOAD_MB   = 200
+MAX_UPLOAD_ROWS = 1_000_000
+CSV_CHUNK_ROWS  = 100_000
+
+
+def upload_format(file_name):
+    """Returns the format of an upload from its file name."""
+    fmt = file_name.rsplit(".", 1)[-1].lower()
+    if fmt not in CUSTOM_FORMATS:
+        raise ValueError(f"Unsupported file format '.{fmt}'. Please upload one of: "
+                         f"{', '.join(CUSTOM_FORMATS)}.")
+    return fmt
+
+
+def check_upload_size(nbytes):
+    """Rejects uploads above `MAX_UPLOAD_MB`."""
+    if nbytes > MAX_UPLOAD_MB * 1024**2:
+        raise ValueError(f"The file weighs {nbytes / 1024**2:.0f} MB, above the limit of "
+                         f"{MAX_UPLOAD_MB} MB.")
+
+
+def _source(content):
+    return io.BytesIO(content) if isinstance(content, bytes) else content
+
+
+def custom_variables(content, fmt):
+    """Returns the variables of an upload, reading only its header."""
+    if fmt == "parquet":
+        columns = pq.read_schema(_source(content)).names
+    elif fmt == "csv":
+        columns = pd.read_csv(_source(content), nrows = 0).columns.tolist()
+    else:
+        columns = pd.read_excel(_source(content), nrows = 0).columns.tolist()
+
+    missing = [column for column in CUSTOM_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}.")
+    return [column for column in columns if column not in CUSTOM_COLUMNS]
+
+
+def _check_rows(n_rows):
+    if n_rows > MAX_UPLOAD_ROWS:
+        raise ValueError(f"The file has more than {MAX_UPLOAD_ROWS:,} rows.")
+
+
+def read_custom_data(content, fmt, variable):
+    """
+    Reads the id columns and `variable` from an upload. Returns a frame with the
+    `country`, `code` and `year` (as text) columns and the variable as numbers.
+    """
+    columns = list(CUSTOM_COLUMNS) + [variable]
+    dtypes  = {"COUNTRY": str, "CODE": str}
+
+    if fmt == "parquet":
+        parquet = pq.ParquetFile(_source(content))
+        _check_rows(parquet.metadata.num_rows)
+        custom = parquet.read(columns = columns).to_pandas()
+
+    elif fmt == "csv":
+        chunks, n_rows = [], 0
+        for chunk in pd.read_csv(_source(content), usecols = columns, dtype = dtypes,
+                                 chunksize = CSV_CHUNK_ROWS):
+            n_rows += len(chunk)
+            _check_rows(n_rows)
+            chunks.append(chunk)
+        custom = pd.concat(chunks, ignore_index = True)
+
+    else:
+        custom = pd.read_excel(_source(content), usecols = columns, dtype = dtypes)
+        _check_rows(len(custom))
+
+    custom = custom[columns].rename(columns = CUSTOM_COLUMNS)
+    custom["code"]   = custom["code"].str.strip().str.upper()
+    custom["year"]   = custom["year"].astype(str)
+    custom[variable] = pd.to_numeric(custom[variable], errors = "coerce")
+    if custom[variable].isna().all():
+        raise ValueError(f"The variable '{variable}' has no numeric values.")
+    return custom
+
+
+def match_codes(custom, codes):
+    """
+    Keeps the rows of `custom` whose code is one of `codes` (the `WB_A3` codes of the
+    boundaries). Returns the matched rows and the number of rows of every unmatched code.
+    """
+    matched   = custom["code"].isin(pd.Index(codes))
+    unmatched = custom.loc[~matched, "code"].fillna("(empty)").value_counts()
+    return custom[matched].reset_index(drop = True), unmatched
@@ -56,6 +56,16 @@ variable_labels = [
     "8.7 Due process of the law and rights of the accused"
 ]
 
+wjp_regions = [
+    "East Asia and Pacific",
+    "Eastern Europe and Central Asia",
+    "EU, EFTA, and North America",
+    "Latin America and Caribbean",
+    "Middle East and North Africa",
+    "South Asia",
+    "Sub-Saharan Africa"
+]
+
 bbox_coords = pd.DataFrame(
     [
         # UN regions
@@ -0,0 +1,344 @@
+"""
+Loaders for the datasets used by the ROLI-Map-App.
+
+The boundaries are published in two formats: the original GeoJSON produced by
+boundaries_cleaning.py and a GeoParquet store written next to it. The GeoParquet
+store is much faster to parse, so it is preferred whenever its manifest confirms
+that it was built from the current GeoJSON and that the file itself is intact.
+
+The ROLI workbook is handled the same way: it is parsed with openpyxl once and cached
+as Parquet, which is read instead (only the requested columns) until the workbook
+changes.
+
+The Mexican states layer follows the same layout: `MX_states.geojson` (written by
+states_boundaries.py) with its own GeoParquet store, and the state scores of
+MSI_data.csv pivoted to one row per state and year.
+"""
+
+import hashlib
+import json
+import os
+
+import geopandas as gpd
+import pandas as pd
+
+# Defining path to data files
+path2data = os.path.join(os.path.dirname(__file__), 
+                         "..", 
+                         "..",
+                         "Data")
+
+BOUNDARIES_STEM     = "data4app"
+BOUNDARIES_GEOJSON  = f"{BOUNDARIES_STEM}.geojson"
+BOUNDARIES_PARQUET  = f"{BOUNDARIES_STEM}.parquet"
+BOUNDARIES_MANIFEST = f"{BOUNDARIES_STEM}.manifest.json"
+BOUNDS_COLUMNS      = ["minx", "miny", "maxx", "maxy"]
+LOD_DIR             = "Simplified files"
+LOD_MANIFEST        = "lod_manifest.json"
+BOUNDARIES_TOPOJSON = os.path.join(LOD_DIR, "WJPboundaries.topojson")
+LOD_TOPOJSON        = "simplified_gdf_{name}.topojson"
+ROLI_XLSX           = "ROLI_data.xlsx"
+ROLI_PARQUET        = "ROLI_data.parquet"
+ROLI_MANIFEST       = "ROLI_data.manifest.json"
+ROLI_ID_COLUMNS     = ["country", "year", "code", "region"]
+STATES_STEM         = "MX_states"
+MSI_CSV             = "MSI_data.csv"
+
+# MSI_data.csv codes both Mexico City and the State of Mexico as MX-MEX
+MSI_STATE_IDS       = {"Ciudad de Mexico": "MX-CMX"}
+
+
+def file_checksum(path, chunk_size = 1 << 20):
+    """Returns the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def boundary_files(stem = BOUNDARIES_STEM):
+    """Returns the GeoJSON, GeoParquet and manifest file names of a boundary layer."""
+    return f"{stem}.geojson", f"{stem}.parquet", f"{stem}.manifest.json"
+
+
+def write_boundary_store(boundaries, data_dir = path2data, stem = BOUNDARIES_STEM):
+    """
+    Writes the boundaries as GeoParquet (with precomputed per-country bounds) and a
+    manifest holding the checksums of the GeoJSON source and of the parquet file.
+    """
+    geojson_file, parquet_file, manifest_file = boundary_files(stem)
+    store = boundaries.reset_index(drop = True)
+    store[BOUNDS_COLUMNS] = store.geometry.bounds.to_numpy()
+
+    parquet_path = os.path.join(data_dir, parquet_file)
+    geojson_path = os.path.join(data_dir, geojson_file)
+    store.to_parquet(parquet_path, compression = "zstd")
+
+    manifest = {
+        "source"         : geojson_file,
+        "source_sha256"  : file_checksum(geojson_path) if os.path.exists(geojson_path) else None,
+        "parquet"        : parquet_file,
+        "parquet_sha256" : file_checksum(parquet_path),
+        "features"       : len(store)
+    }
+    with open(os.path.join(data_dir, manifest_file), "w") as f:
+        json.dump(manifest, f, indent = 2)
+
+    return manifest
+
+
+def boundary_store_is_valid(data_dir = path2data, stem = BOUNDARIES_STEM):
+    """Returns `True` if the GeoParquet store matches its manifest and the current GeoJSON."""
+    geojson_file, parquet_file, manifest_file = boundary_files(stem)
+    parquet_path  = os.path.join(data_dir, parquet_file)
+    geojson_path  = os.path.join(data_dir, geojson_file)
+    manifest_path = os.path.join(data_dir, manifest_file)
+
+    if not (os.path.exists(parquet_path) and os.path.exists(manifest_path)):
+        return False
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get("parquet_sha256") != file_checksum(parquet_path):
+        return False
+
+    # The GeoJSON is not always deployed. When it is, the store must have been built from it.
+    if os.path.exists(geojson_path):
+        return manifest.get("source_sha256") == file_checksum(geojson_path)
+
+    return True
+
+
+def load_boundaries(data_dir = path2data, prefer = "parquet", stem = BOUNDARIES_STEM):
+    """
+    Loads the country boundaries (or the boundary layer `stem`), reading the GeoParquet
+    store when it is valid and falling back to the GeoJSON file otherwise.
+    """
+    geojson_file, parquet_file, _ = boundary_files(stem)
+    if prefer == "parquet" and boundary_store_is_valid(data_dir, stem):
+        return gpd.read_parquet(os.path.join(data_dir, parquet_file))
+
+    boundaries = gpd.read_file(os.path.join(data_dir, geojson_file))
+    boundaries[BOUNDS_COLUMNS] = boundaries.geometry.bounds.to_numpy()
+    return boundaries
+
+
+def boundaries_checksum(data_dir = path2data):
+    """
+    Identifies the current country boundaries: the checksum of the GeoJSON, or the one
+    recorded in the manifest of the GeoParquet store when the GeoJSON is not deployed.
+    """
+    geojson_file, _, manifest_file = boundary_files()
+    geojson_path  = os.path.join(data_dir, geojson_file)
+    manifest_path = os.path.join(data_dir, manifest_file)
+
+    if os.path.exists(geojson_path):
+        return file_checksum(geojson_path)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        return manifest.get("source_sha256") or manifest.get("parquet_sha256")
+    return None
+
+
+def write_lod_store(layers, data_dir = path2data):
+    """
+    Writes the simplified boundary layers as GeoParquet files and a manifest listing
+    them. `layers` maps a level name to a (tolerance in degrees, GeoDataFrame) pair.
+    The manifest holds the checksum of the boundaries they were simplified from, which
+    also covers the TopoJSON files written next to them.
+    """
+    lod_dir = os.path.join(data_dir, LOD_DIR)
+    os.makedirs(lod_dir, exist_ok = True)
+
+    levels = []
+    for name, (tolerance, layer) in layers.items():
+        if layer.crs is None:
+            layer = layer.set_crs("EPSG:4326")
+        filename = f"boundaries_{name}.parquet"
+        layer.reset_index(drop = True).to_parquet(os.path.join(lod_dir, filename), 
+                                                  compression = "zstd")
+        levels.append({
+            "name"      : name,
+            "tolerance" : tolerance,
+            "path"      : os.path.join(LOD_DIR, filename)
+        })
+
+    levels = sorted(levels, key = lambda level: level["tolerance"])
+    with open(os.path.join(lod_dir, LOD_MANIFEST), "w") as f:
+        json.dump({"source_sha256": boundaries_checksum(data_dir), "levels": levels}, f, 
+                  indent = 2)
+
+    return levels
+
+
+def lod_store_is_valid(data_dir = path2data):
+    """
+    Returns `True` if the simplified layers and TopoJSON files were built from the
+    current boundaries.
+    """
+    manifest_path = os.path.join(data_dir, LOD_DIR, LOD_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return False
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return manifest.get("source_sha256") == boundaries_checksum(data_dir)
+
+
+def load_lod_manifest(data_dir = path2data):
+    """
+    Returns the available simplification levels, from finest to coarsest. There are
+    none when they were built from other boundaries than the current ones.
+    """
+    if not lod_store_is_valid(data_dir):
+        return []
+
+    with open(os.path.join(data_dir, LOD_DIR, LOD_MANIFEST)) as f:
+        levels = json.load(f)["levels"]
+
+    return [level for level in levels if os.path.exists(os.path.join(data_dir, level["path"]))]
+
+
+def load_lod_layer(level, data_dir = path2data):
+    """Loads one of the simplified boundary layers listed in the LOD manifest."""
+    return gpd.read_parquet(os.path.join(data_dir, level["path"]))
+
+
+def read_roli_workbook(data_dir = path2data):
+    """Parses the ROLI workbook with openpyxl (slow). Years are read as strings."""
+    roli_data         = pd.read_excel(os.path.join(data_dir, ROLI_XLSX))
+    roli_data["year"] = roli_data["year"].apply(str)
+    return roli_data
+
+
+def write_roli_store(data_dir = path2data):
+    """
+    Converts the ROLI workbook to Parquet and writes a manifest with the modification
+    time, size and checksum of the workbook it was built from. Returns the scores.
+    """
+    xlsx_path = os.path.join(data_dir, ROLI_XLSX)
+    roli_data = read_roli_workbook(data_dir)
+    roli_data.to_parquet(os.path.join(data_dir, ROLI_PARQUET), compression = "zstd")
+
+    manifest = {
+        "source"        : ROLI_XLSX,
+        "source_mtime"  : os.path.getmtime(xlsx_path),
+        "source_size"   : os.path.getsize(xlsx_path),
+        "source_sha256" : file_checksum(xlsx_path),
+        "parquet"       : ROLI_PARQUET,
+        "columns"       : roli_data.columns.tolist()
+    }
+    with open(os.path.join(data_dir, ROLI_MANIFEST), "w") as f:
+        json.dump(manifest, f, indent = 2)
+
+    return roli_data
+
+
+def roli_store_is_valid(data_dir = path2data):
+    """
+    Returns `True` if the Parquet cache was built from the current workbook. The
+    workbook is only hashed when its modification time or size changed, and the
+    manifest is refreshed when the contents turn out to be the same.
+    """
+    xlsx_path     = os.path.join(data_dir, ROLI_XLSX)
+    manifest_path = os.path.join(data_dir, ROLI_MANIFEST)
+    if not (os.path.exists(os.path.join(data_dir, ROLI_PARQUET)) and os.path.exists(manifest_path)):
+        return False
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    # Deployments may ship the cache without the workbook
+    if not os.path.exists(xlsx_path):
+        return True
+
+    mtime, size = os.path.getmtime(xlsx_path), os.path.getsize(xlsx_path)
+    if manifest.get("source_mtime") == mtime and manifest.get("source_size") == size:
+        return True
+
+    if manifest.get("source_sha256") != file_checksum(xlsx_path):
+        return False
+
+    manifest.update(source_mtime = mtime, source_size = size)
+    try:
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent = 2)
+    except OSError:
+        pass
+    return True
+
+
+def roli_checksum(data_dir = path2data):
+    """Returns the SHA-256 of the workbook the cached scores were built from."""
+    if roli_store_is_valid(data_dir):
+        with open(os.path.join(data_dir, ROLI_MANIFEST)) as f:
+            return json.load(f)["source_sha256"]
+    return file_checksum(os.path.join(data_dir, ROLI_XLSX))
+
+
+def load_roli(data_dir = path2data, variables = None):
+    """
+    Loads the Rule of Law Index scores from the Parquet cache, rebuilding it from the
+    workbook when the workbook changed. Pass `variables` to only load those score
+    columns (the id columns are always loaded).
+    """
+    columns = None if variables is None else ROLI_ID_COLUMNS + [
+        variable for variable in variables if variable not in ROLI_ID_COLUMNS
+    ]
+
+    if roli_store_is_valid(data_dir):
+        return pd.read_parquet(os.path.join(data_dir, ROLI_PARQUET), columns = columns)
+
+    try:
+        roli_data = write_roli_store(data_dir)
+    except OSError:
+        # Read-only deployments keep parsing the workbook
+        roli_data = read_roli_workbook(data_dir)
+
+    return roli_data if columns is None else roli_data[columns]
+
+
+def msi_year(year):
+    """Spells the MSI survey years like the ROLI ones: "19_20" becomes "2019-2020"."""
+    if "_" not in year:
+        return year
+    start, end = year.split("_")
+    return f"20{start}-20{end}"
+
+
+def load_msi(data_dir = path2data):
+    """
+    Loads the Mexico States Index scores (one row per state, category and year) with
+    unique state codes and years spelled like the ROLI ones.
+    """
+    msi = pd.read_csv(os.path.join(data_dir, MSI_CSV), dtype = {"Year": str})
+    msi["State_Id"] = msi["State"].map(MSI_STATE_IDS).fillna(msi["State_Id"])
+    msi["Year"]     = msi["Year"].map(msi_year)
+    return msi
+
+
+def msi_scores(msi):
+    """
+    Pivots the long MSI scores to the layout of the ROLI scores: one row per state and
+    year with the id columns first and one column per category, in the order of the
+    source file.
+    """
+    scores = (
+        msi
+        .pivot_table(index = ["State", "Year", "State_Id"], columns = "Category", 
+                     values = "Score", aggfunc = "first", sort = False)
+        .reset_index()
+        .rename(columns = {"State": "country", "Year": "year", "State_Id": "code"})
+    )
+    scores.columns.name = None
+    scores.insert(3, "region", "Mexico")
+    return scores
+
+
+def msi_labels(msi):
+    """Returns the label of every MSI category, as worded in the latest year."""
+    latest = msi.sort_values("Year").drop_duplicates("Category", keep = "last")
+    return dict(zip(latest["Category"], latest["Label"]))
@@ -0,0 +1,142 @@
+"""
+Helpers to serialize the app outputs (figures and tables) to bytes.
+"""
+
+import gzip
+import io
+import math
+import re
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+# File extension and MIME type of every download format. SVGZ is a gzip-compressed SVG
+MIME_TYPES = {
+    "png"  : "image/png",
+    "svg"  : "image/svg+xml",
+    "svgz" : "image/svg+xml",
+    "xlsx" : "application/vnd.ms-excel"
+}
+
+# SVG user units are points (1/72 inch)
+SVG_UNITS_PER_INCH = 72
+
+_SVG_PATH    = re.compile(r"<path\b[^>]*?/>", re.S)
+_SVG_PATH_D  = re.compile(r'\sd="([^"]*)"')
+_SVG_STYLE   = re.compile(r'\sstyle="([^"]*)"')
+_SVG_NUMBER  = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_SVG_POLYGON = re.compile(r"^[MLz\s\d.eE+-]*$")
+
+
+def _quantized_subpath(subpath, step, decimals):
+    """
+    Snaps the vertices of one "M ... L ... [z]" subpath to a grid of size `step` and
+    drops the vertices that fall on the same grid cell as the previous one. Returns
+    None when a closed ring collapses to less than three vertices.
+    """
+    closed = subpath.rstrip().endswith("z")
+    cells  = np.round(
+        np.array(_SVG_NUMBER.findall(subpath), dtype = float).reshape(-1, 2) / step
+    )
+    keep   = np.ones(len(cells), dtype = bool)
+    keep[1:] = np.any(cells[1:] != cells[:-1], axis = 1)
+    vertices = cells[keep]
+
+    if closed:
+        if len(vertices) > 1 and np.array_equal(vertices[0], vertices[-1]):
+            vertices = vertices[:-1]
+        if len(vertices) < 3:
+            return None
+    elif len(vertices) < 2:
+        vertices = cells[[0, -1]]
+
+    coords = np.char.mod(f"%.{decimals}f", vertices * step)
+    if decimals:
+        coords = np.char.rstrip(np.char.rstrip(coords, "0"), ".")
+    points = [f"{x} {y}" for x, y in coords]
+    return "M " + " L ".join(points) + (" z" if closed else "")
+
+
+def quantize_svg(svg, dpi):
+    """
+    Shrinks a matplotlib SVG without visible changes at the given output resolution:
+    polygon coordinates are snapped to the pixel grid, vertices falling on the same
+    pixel are dropped (and so are rings smaller than a pixel), and repeated inline
+    styles are replaced by CSS classes. Glyphs and other transformed paths are kept.
+    """
+    step     = SVG_UNITS_PER_INCH / dpi
+    # Enough decimals to write the grid positions with an error below 1/10 of a pixel
+    decimals = max(0, math.ceil(-math.log10(step / 10)))
+
+    def quantize_path(match):
+        element = match.group(0)
+        d = _SVG_PATH_D.search(element)
+        if d is None or "transform=" in element or not _SVG_POLYGON.match(d.group(1)):
+            return element
+        subpaths = [
+            _quantized_subpath("M" + subpath, step, decimals) 
+            for subpath in d.group(1).split("M")[1:]
+        ]
+        subpaths = [subpath for subpath in subpaths if subpath is not None]
+        if not subpaths:
+            return ""
+        return element[:d.start(1)] + " ".join(subpaths) + element[d.end(1):]
+
+    svg = _SVG_PATH.sub(quantize_path, svg.decode("utf-8"))
+
+    # Merging identical styles into CSS classes
+    classes = {}
+    def style_class(match):
+        name = classes.setdefault(match.group(1), f"s{len(classes)}")
+        return f' class="{name}"'
+    svg = _SVG_STYLE.sub(style_class, svg)
+
+    if classes:
+        rules = "".join(f".{name}{{{style}}}" for style, name in classes.items())
+        root  = svg.index(">", svg.index("<svg")) + 1
+        svg   = svg[:root] + f'\n <style type="text/css">{rules}</style>' + svg[root:]
+
+    return svg.encode("utf-8")
+
+
+def figure_bytes(fig, fmt, quantize = False, **kwargs):
+    """
+    Renders a matplotlib figure to bytes in the given format (at the figure DPI by
+    default). With `quantize`, SVG and SVGZ outputs go through `quantize_svg`.
+    """
+    # Reused figures keep the DPI they were created with unless it is given explicitly
+    kwargs.setdefault("dpi", fig.dpi)
+    if quantize and fmt in ("svg", "svgz"):
+        svg = quantize_svg(figure_bytes(fig, "svg", **kwargs), kwargs["dpi"])
+        return gzip.compress(svg, mtime = 0) if fmt == "svgz" else svg
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format = fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def figure_exports(fig, formats, close = True, **kwargs):
+    """
+    Renders a figure once per requested format and returns a dictionary of bytes keyed
+    by format. The figure is closed afterwards unless `close` is False.
+    """
+    try:
+        exports = {}
+        for fmt in formats:
+            # PNG previews are cropped to the drawn area, as st.pyplot used to do
+            options      = dict(kwargs, bbox_inches = "tight") if fmt == "png" else kwargs
+            exports[fmt] = figure_bytes(fig, fmt, **options)
+        return exports
+    finally:
+        if close:
+            plt.close(fig)
+
+
+def table_xlsx(table, sheet_name = "Data-Table"):
+    """Writes a table to an Excel workbook and returns its bytes."""
+    buffer = io.BytesIO()
+    # You need to install the XlsxWriter. See: https://xlsxwriter.readthedocs.io/
+    with pd.ExcelWriter(buffer, engine = "xlsxwriter") as writer:
+        table.to_excel(writer, sheet_name = sheet_name)
+    return buffer.getvalue()
@@ -0,0 +1,95 @@
+"""
+Geometry helpers used to draw regional and custom maps.
+
+Regional and custom maps are drawn using the Miller Cylindrical Projection
+(see: https://epsg.io/54003). The boundaries are projected once when the data is
+loaded, and every map request only needs to project its bounding box. Because the
+Miller projection maps meridians and parallels to straight vertical and horizontal
+lines, a longitude/latitude bounding box is still an axis-aligned box once projected.
+"""
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import Transformer
+from shapely.geometry import box
+
+from src.utils.data_adds import bbox_coords
+
+MILLER = "ESRI:54003"
+
+WORLD_BOUNDS = (-180, -90, 180, 90)
+
+# A simplification level is used when its tolerance is below this fraction of a pixel
+LOD_PIXEL_TOLERANCE = 0.5
+
+_to_miller = Transformer.from_crs("EPSG:4326", MILLER, always_xy = True)
+
+
+def region_bounds(selected_regions):
+    """Returns the (min_lon, min_lat, max_lon, max_lat) extent covering the selected regions."""
+    regions_coords = bbox_coords[bbox_coords["region"].isin(selected_regions)]
+    return (
+        float(regions_coords.min_X.min()),
+        float(regions_coords.min_Y.min()),
+        float(regions_coords.max_X.max()),
+        float(regions_coords.max_Y.max())
+    )
+
+
+def select_lod(levels, bounds, width_in, height_in, dpi):
+    """
+    Picks the coarsest simplification level whose tolerance stays below a fraction of
+    the size of an output pixel (in degrees). Returns `None` when only the
+    full-resolution boundaries are fine enough.
+    """
+    min_X, min_Y, max_X, max_Y = bounds
+    width_px  = max(width_in * dpi, 1)
+    height_px = max(height_in * dpi, 1)
+    pixel_deg = min((max_X - min_X) / width_px, (max_Y - min_Y) / height_px)
+
+    selected = None
+    for level in sorted(levels, key = lambda level: level["tolerance"]):
+        if level["tolerance"] <= pixel_deg * LOD_PIXEL_TOLERANCE:
+            selected = level
+    return selected
+
+
+def extension_key(bounds):
+    """Normalizes a (min_lon, min_lat, max_lon, max_lat) extent so it can be used as a cache key."""
+    return tuple(round(float(x), 6) for x in bounds)
+
+
+def project_bounds(bounds):
+    """Projects a (min_lon, min_lat, max_lon, max_lat) extent to Miller coordinates."""
+    min_X, min_Y, max_X, max_Y = bounds
+    (pmin_X, pmax_X), (pmin_Y, pmax_Y) = _to_miller.transform([min_X, max_X], [min_Y, max_Y])
+    return (pmin_X, pmin_Y, pmax_X, pmax_Y)
+
+
+def project_bbox(bounds):
+    """Returns the Miller-projected bounding box of a (min_lon, min_lat, max_lon, max_lat) extent."""
+    return box(*project_bounds(bounds))
+
+
+def clip_to_bbox(boundaries, bbox):
+    """
+    Keeps the geometries intersecting the bounding box and clips them to it.
+
+    Candidates are selected through the spatial index of the GeoDataFrame. Since the
+    bounding box is axis-aligned, a geometry whose bounds fit inside the box is fully
+    contained in it, so only the geometries straddling the edges are clipped.
+    """
+    candidates = np.sort(boundaries.sindex.query(bbox, predicate = "intersects"))
+    clipped    = boundaries.iloc[candidates].copy()
+
+    geoms    = clipped.geometry.to_numpy().copy()
+    gbounds  = shapely.bounds(geoms)
+    min_X, min_Y, max_X, max_Y = bbox.bounds
+    straddle = ~(
+        (gbounds[:, 0] >= min_X) & (gbounds[:, 1] >= min_Y) &
+        (gbounds[:, 2] <= max_X) & (gbounds[:, 3] <= max_Y)
+    )
+    geoms[straddle] = shapely.intersection(geoms[straddle], bbox)
+    clipped.geometry = gpd.GeoSeries(geoms, index = clipped.index, crs = boundaries.crs)
+    return clipped
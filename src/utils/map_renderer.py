@@ -0,0 +1,151 @@
+"""
+Reusable choropleth renderer.
+
+`GeoDataFrame.plot` rebuilds one matplotlib patch per geometry on every call. The
+renderer defined here converts the boundaries of a map extension to matplotlib paths
+once, keeps them in a single collection attached to a persistent figure, and on every
+request only updates the face colors, line widths, figure size and legend before the
+figure is saved.
+"""
+
+import threading
+
+import numpy as np
+import shapely
+import matplotlib.cm as cm
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+from matplotlib.path import Path
+
+from src.utils.caching import frame_nbytes
+
+EDGE_COLOR = "#EBEBEB"
+
+
+def geometry_paths(geoms):
+    """
+    Converts (multi)polygons to one compound matplotlib Path per geometry. As done by
+    GeoPandas, the rings are normalized first so that holes are drawn as holes.
+    """
+    geoms = shapely.normalize(np.asarray(geoms))
+
+    parts, part_geom = shapely.get_parts(geoms, return_index = True)
+    polygons  = shapely.get_type_id(parts) == 3
+    parts, part_geom = parts[polygons], part_geom[polygons]
+
+    rings, ring_part   = shapely.get_rings(parts, return_index = True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index = True)
+
+    codes = np.full(len(coords), Path.LINETO, dtype = Path.code_type)
+    if len(coords):
+        ring_start = np.r_[True, coord_ring[1:] != coord_ring[:-1]]
+        ring_end   = np.r_[coord_ring[1:] != coord_ring[:-1], True]
+        codes[ring_start] = Path.MOVETO
+        codes[ring_end]   = Path.CLOSEPOLY
+
+    splits = np.searchsorted(part_geom[ring_part][coord_ring], np.arange(1, len(geoms)))
+    return [
+        Path(vertices, path_codes)
+        for vertices, path_codes in zip(np.split(coords, splits), np.split(codes, splits))
+    ]
+
+
+def set_map_aspect(ax, boundaries):
+    """Sets the axes limits (with the default margins) and aspect ratio as GeoPandas does."""
+    min_X, min_Y, max_X, max_Y = boundaries.total_bounds
+    ax.update_datalim([(min_X, min_Y), (max_X, max_Y)])
+    ax.autoscale_view()
+    if boundaries.crs and boundaries.crs.is_geographic:
+        ax.set_aspect(1 / np.cos(np.mean([min_Y, max_Y]) * np.pi / 180))
+    else:
+        ax.set_aspect("equal")
+
+
+class MapRenderer:
+    """
+    Draws choropleth maps of a fixed set of boundaries, recoloring a cached collection.
+
+    When `borders` (a list of (n, 2) vertex arrays, see `Topology.borders`) is given,
+    the countries are filled without outlines and each border line is drawn once on
+    top of them instead.
+    """
+
+    def __init__(self, boundaries, borders = None):
+        self.boundaries = boundaries
+        self.paths      = geometry_paths(boundaries.geometry)
+        self.borders    = borders
+        self.nbytes     = frame_nbytes(boundaries) + sum(p.vertices.nbytes for p in self.paths)
+        if borders is not None:
+            self.nbytes += sum(line.nbytes for line in borders)
+
+        # A bare Figure (not pyplot) so it is never tracked by the pyplot state machine
+        self.figure     = Figure()
+        self.ax         = self.figure.add_subplot(1, 1, 1)
+        self.collection = PathCollection(
+            self.paths,
+            edgecolors = EDGE_COLOR if borders is None else "none",
+            transform  = self.ax.transData
+        )
+        self.ax.add_collection(self.collection, autolim = False)
+
+        self.border_collection = None
+        if borders is not None:
+            self.border_collection = LineCollection(
+                borders,
+                colors    = EDGE_COLOR,
+                transform = self.ax.transData
+            )
+            self.ax.add_collection(self.border_collection, autolim = False)
+
+        set_map_aspect(self.ax, boundaries)
+        self.ax.axis("off")
+
+        self._subplotspec = self.ax.get_subplotspec()
+        self._legend      = None
+        self._lock        = threading.Lock()
+
+    def _reset_legend(self):
+        # Removing the previous color bar or legend and giving its space back to the map
+        if self._legend is not None:
+            self._legend.remove()
+            self._legend = None
+        self.ax.set_subplotspec(self._subplotspec)
+        self.ax.set_position(self._subplotspec.get_position(self.figure))
+
+    def draw(self, facecolors, width_in, height_in, dpi, linewidth = 0.75, 
+             cmap = None, norm = None, categories = None):
+        """
+        Recolors the map and returns its figure. Pass `cmap` and `norm` to draw a color
+        bar, or `categories` (a label-to-color mapping) to draw a categorical legend.
+
+        The figure is shared, so callers must serialize it while holding `self.lock`.
+        """
+        self._reset_legend()
+        self.figure.set_size_inches(width_in, height_in)
+        self.figure.set_dpi(dpi)
+        self.collection.set_facecolors(facecolors)
+        if self.border_collection is None:
+            self.collection.set_linewidths(linewidth)
+        else:
+            self.collection.set_linewidths(0)
+            self.border_collection.set_linewidths(linewidth)
+
+        if cmap is not None:
+            self._legend = self.figure.colorbar(
+                cm.ScalarMappable(norm = norm, cmap = cmap),
+                ax = self.ax
+            )
+        elif categories:
+            self._legend = self.ax.legend(
+                handles = [
+                    Patch(facecolor = color, edgecolor = EDGE_COLOR, label = label)
+                    for label, color in categories.items()
+                ]
+            )
+        return self.figure
+
+    @property
+    def lock(self):
+        """Lock guarding the shared figure between `draw` and saving it."""
+        return self._lock
@@ -0,0 +1,165 @@
+"""
+Lightweight profiling of the render pipeline.
+
+A `StageTimer` records the wall time of every stage of a request (filtering the
+scores, clipping and projecting the boundaries, drawing, saving each format...) and,
+when `memory` is on, the peak memory allocated by Python and numpy during the stage.
+Memory is traced with tracemalloc, which makes a render about five times slower and
+does not see the buffers of the Agg rasterizer, so it is off by default and only
+runs while a timer that asked for it is open. The breakdown is shown in the app and
+can also be written offline:
+
+- ROLI_PROFILE_LOG=<path>: appends one JSON line per request to <path>.
+- ROLI_PROFILE_DIR=<dir>: saves a cProfile dump of every request in <dir>, to be read
+  with `pstats` or snakeviz.
+
+tracemalloc and cProfile are process-wide, so the memory and the profile of requests
+running at the same time in other sessions overlap.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_LOG = os.environ.get("ROLI_PROFILE_LOG")
+PROFILE_DIR = os.environ.get("ROLI_PROFILE_DIR")
+
+logger = logging.getLogger("roli_map.profiling")
+if PROFILE_LOG:
+    handler = logging.FileHandler(PROFILE_LOG)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+# cProfile cannot run two profilers at once
+_profile_lock = threading.Lock()
+
+# Timers tracing memory, so that tracemalloc stops with the last of them
+_memory_lock  = threading.Lock()
+_memory_users = 0
+
+
+def _start_tracing():
+    global _memory_users
+    with _memory_lock:
+        if _memory_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _memory_users += 1
+
+
+def _stop_tracing():
+    global _memory_users
+    with _memory_lock:
+        _memory_users -= 1
+        if _memory_users == 0:
+            tracemalloc.stop()
+
+
+class StageTimer:
+    """
+    Records the wall time (and optionally the peak memory) of the stages of a request.
+    Used as a context manager, the timer is finished when the block exits, even on
+    errors, so that memory tracing and profiling never outlive the request. `fields`
+    are added to its record.
+    """
+
+    def __init__(self, name = "request", memory = False, profile_dir = PROFILE_DIR, **fields):
+        self.name        = name
+        self.memory      = memory
+        self.profile_dir = profile_dir
+        self.fields      = fields
+        self.stages      = []
+        self.started     = time.time()
+        self.record      = None
+        self._start      = time.perf_counter()
+        self._profiler   = None
+
+        if memory:
+            _start_tracing()
+        if profile_dir and _profile_lock.acquire(blocking = False):
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @contextmanager
+    def stage(self, name):
+        """Times the block as the stage `name`."""
+        if self.memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"stage": name, "seconds": time.perf_counter() - start}
+            if self.memory:
+                record["peak_mb"] = (tracemalloc.get_traced_memory()[1] - baseline) / 1024**2
+            self.stages.append(record)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish(error = None if exc_type is None else repr(exc_value))
+
+    @property
+    def total(self):
+        """Wall time from the creation of the timer until it was finished (or until now)."""
+        if self.record is not None:
+            return self.record["seconds"]
+        return time.perf_counter() - self._start
+
+    def table(self):
+        """Returns the stages as rows, with their share of the total time."""
+        total = self.total
+        return [dict(record, share = record["seconds"] / total) for record in self.stages]
+
+    def finish(self, **fields):
+        """
+        Stops tracing memory and profiling, writes the cProfile dump and the JSON log
+        line when they are enabled, and returns the record of the request (plus
+        `fields`). Only the first call has an effect.
+        """
+        if self.record is not None:
+            return self.record
+
+        record = {
+            "name"    : self.name,
+            "started" : self.started,
+            "seconds" : self.total,
+            "stages"  : self.stages,
+            **self.fields,
+            **fields
+        }
+        self.record = record
+        if self.memory:
+            self.memory = False
+            _stop_tracing()
+        if self._profiler is not None:
+            profiler, self._profiler = self._profiler, None
+            try:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok = True)
+                path = os.path.join(self.profile_dir, f"{self.name}_{int(self.started * 1000)}.prof")
+                profiler.dump_stats(path)
+                record["profile"] = path
+            finally:
+                _profile_lock.release()
+
+        logger.info(json.dumps(record, default = str))
+        return record
+
+
+class NullTimer:
+    """Stands in for a `StageTimer` when a request is not profiled."""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+
+NULL_TIMER = NullTimer()
@@ -0,0 +1,562 @@
+"""
+Map rendering pipeline shared by the Streamlit app and the batch CLI.
+
+A map request is a plain dictionary of parameters (see `render_outputs`), so the same
+dictionary can be hashed for the render cache, read from a batch job file or sent to a
+worker process. None of the functions in this module depend on Streamlit.
+"""
+
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+import matplotlib.colors as colors
+import matplotlib.cm as cm
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.figure import Figure
+
+from src.utils.coloring import MISSING_COLOR, score_colors, score_hex_codes
+from src.utils.data_loading import (
+    path2data, BOUNDARIES_TOPOJSON, LOD_DIR, LOD_TOPOJSON, STATES_STEM, MSI_CSV, file_checksum, 
+    load_boundaries, load_roli, roli_checksum, load_lod_manifest, load_lod_layer, 
+    lod_store_is_valid, load_msi, msi_scores, msi_labels
+)
+from src.utils.exporting import figure_exports, table_xlsx
+from src.utils.map_renderer import EDGE_COLOR, MapRenderer, set_map_aspect
+from src.utils.profiling import NULL_TIMER
+from src.utils.geometry import (
+    MILLER, WORLD_BOUNDS, region_bounds, select_lod, extension_key, project_bbox, clip_to_bbox
+)
+from src.utils.scores import build_change_cube, lookup_changes
+from src.utils.topology import load_topology
+
+DEFAULT_COLORS = ["#D40276", "#E51328", "#f2a241", "#ccc555", "#578e7f", "#012d28"]
+
+DEFAULT_PARAMS = {
+    "extension"    : "World",
+    "bounds"       : WORLD_BOUNDS,
+    "highlighted"  : None,
+    "opacity"      : False,
+    "delta"        : False,
+    "base_year"    : None,
+    "bins"         : None,
+    "colors"       : DEFAULT_COLORS,
+    "floor"        : 0,
+    "ceiling"      : 1,
+    "width_in"     : 25,
+    "height_in"    : 16,
+    "dpi"          : 100,
+    "linewidth"    : 0.75,
+    "color_bar"    : True,
+    "quantize_svg" : True
+}
+
+
+def load_master_data(data_dir = path2data, topology = False):
+    """
+    Loads the boundaries, the ROLI scores and everything derived from them.
+
+    With `topology`, the boundaries are loaded from the shared-arc TopoJSON written by
+    boundary_simplification.py (when it exists and was built from the current
+    boundaries) and geometries are only materialized for the extension of each map.
+    `boundaries` then only holds the attributes of the countries, and
+    `topology`/`topology_miller` hold the arcs.
+    """
+    topology_path = os.path.join(data_dir, BOUNDARIES_TOPOJSON)
+    if topology and os.path.exists(topology_path) and lod_store_is_valid(data_dir):
+        topology   = load_topology(topology_path)
+        geometries = {
+            "boundaries"      : topology.attributes,
+            "topology"        : topology,
+            "topology_miller" : topology.to_crs(MILLER)
+        }
+    else:
+        boundaries = load_boundaries(data_dir)
+        geometries = {
+            "boundaries"        : boundaries,
+            "boundaries_miller" : boundaries.to_crs(MILLER)
+        }
+
+    roli_data  = load_roli(data_dir)
+    return {
+        **geometries,
+        "layer"             : "countries",
+        "roli"              : roli_data,
+        "changes"           : build_change_cube(roli_data),
+        "fingerprint"       : roli_checksum(data_dir),
+        "lod_levels"        : load_lod_manifest(data_dir),
+        "data_dir"          : data_dir
+    }
+
+
+def load_states_data(data_dir = path2data):
+    """
+    Loads the Mexican states layer in the same layout as `load_master_data`, so that
+    state maps go through the same rendering and caching path. The state codes (such
+    as MX-AGU) take the place of the country codes: the boundaries get them in a WB_A3
+    column and the scores in their `code` column. `labels` maps each category to its
+    description.
+    """
+    boundaries = load_boundaries(data_dir, stem = STATES_STEM)
+    boundaries["WB_A3"] = boundaries["State_Id"]
+
+    msi       = load_msi(data_dir)
+    msi_data  = msi_scores(msi)
+    return {
+        "boundaries"        : boundaries,
+        "boundaries_miller" : boundaries.to_crs(MILLER),
+        "layer"             : "mx_states",
+        "roli"              : msi_data,
+        "changes"           : build_change_cube(msi_data),
+        "labels"            : msi_labels(msi),
+        "fingerprint"       : file_checksum(os.path.join(data_dir, MSI_CSV)),
+        "lod_levels"        : [],
+        "data_dir"          : data_dir
+    }
+
+
+@functools.lru_cache(maxsize = 4)
+def load_lod_boundaries(name, data_dir = path2data, topology = False):
+    """
+    Loads a simplified boundary layer together with its Miller projection. With
+    `topology`, the simplified TopoJSON of the level is preferred when it exists.
+    """
+    topology_path = os.path.join(data_dir, LOD_DIR, LOD_TOPOJSON.format(name = name))
+    if topology and os.path.exists(topology_path):
+        topology = load_topology(topology_path)
+        return {
+            "topology"        : topology,
+            "topology_miller" : topology.to_crs(MILLER)
+        }
+
+    level = next(level for level in load_lod_manifest(data_dir) if level["name"] == name)
+    layer = load_lod_layer(level, data_dir)
+    return {
+        "boundaries"        : layer,
+        "boundaries_miller" : layer.to_crs(MILLER)
+    }
+
+
+def world_boundaries(data):
+    """Returns the world boundaries, materializing them from the topology when needed."""
+    if "topology" in data:
+        return data["topology"].to_geodataframe()
+    return data["boundaries"]
+
+
+def delta_bin_labels(bin_edges):
+    """Returns the category labels used for the percentage-change bins."""
+    return [
+        f"From {y:.2f} to {bin_edges[x+1]:.2f}" 
+        for x, y in enumerate(bin_edges[:-1])
+    ]
+
+
+def regional_highlights(regions, data):
+    """Returns the codes of the countries that belong to WJP regions or UN subregions."""
+    roli       = data["roli"]
+    boundaries = data["boundaries"]
+    codes = set(roli.loc[roli["region"].isin(regions), "code"])
+    codes.update(boundaries.loc[boundaries["SUBREGION"].isin(regions), "WB_A3"])
+    return sorted(codes)
+
+
+def request_params(data, **params):
+    """
+    Completes a map request with the default parameters. Regional requests may give a
+    list of `regions` instead of explicit `bounds` and `highlighted` countries.
+    """
+    request = dict(DEFAULT_PARAMS, **params)
+    regions = request.pop("regions", None)
+
+    if regions:
+        request["extension"] = "Regional"
+        request["bounds"]    = region_bounds(regions)
+        if request["highlighted"] is None:
+            request["highlighted"] = regional_highlights(regions, data)
+        request["opacity"]   = params.get("opacity", True)
+
+    if request["extension"] == "World":
+        request["bounds"] = WORLD_BOUNDS
+
+    request["bounds"]  = extension_key(request["bounds"])
+    request["dataset"] = params.get("dataset", data["fingerprint"])
+    if request["delta"]:
+        request["floor"], request["ceiling"] = -1, 1
+    return request
+
+
+def filter_scores(params, data):
+    """Returns the scores (or percentage changes) for the requested year."""
+    roli_data = data["roli"]
+
+    if not params["delta"]:
+        return roli_data[roli_data["year"] == params["year"]]
+
+    target_variable = params["variable"]
+    filtered_roli   = lookup_changes(data["changes"], params["base_year"], params["year"])
+
+    filtered_roli["score"] = filtered_roli[target_variable]
+    filtered_roli[target_variable] = (
+        pd.cut(filtered_roli[target_variable],
+        bins   = params["bins"],
+        labels = delta_bin_labels(params["bins"]))
+    ) 
+    return filtered_roli
+
+
+def map_renderer(params, data, lod_loader = None, geometry_cache = None):
+    """
+    Returns the renderer holding the boundaries to draw: the simplification level that
+    fits the output size, clipped to the map extension and projected for regional and
+    custom maps. Renderers are stored in `geometry_cache` when one is given.
+    """
+    bounds = params["bounds"]
+    lod    = select_lod(data.get("lod_levels", []), bounds, 
+                        params["width_in"], params["height_in"], params["dpi"])
+
+    if lod is None:
+        layers = data
+    else:
+        lod_loader = lod_loader or functools.partial(load_lod_boundaries, 
+                                                     data_dir = data.get("data_dir", path2data),
+                                                     topology = "topology" in data)
+        layers = lod_loader(lod["name"])
+
+    def build():
+        if "topology" in layers:
+            return topology_renderer(layers, params)
+
+        if params["extension"] == "World":
+            return MapRenderer(layers["boundaries"])
+
+        # Masking the world map using the bounding box
+        # The boundaries were already projected to the Miller Cilindrical Projection
+        # when loading the data, so we only project the bounding box here
+        # See: https://epsg.io/54003
+        return MapRenderer(clip_to_bbox(layers["boundaries_miller"], project_bbox(bounds)))
+
+    if geometry_cache is None:
+        return build()
+    extent = "World" if params["extension"] == "World" else bounds
+    return geometry_cache.get_or_create(
+        (data.get("layer", "countries"), lod["name"] if lod else "full", extent), build
+    )
+
+
+def topology_renderer(layers, params):
+    """
+    Builds the renderer of a map from the shared-arc topology: only the countries in
+    the map extension are materialized, and each border is drawn once.
+    """
+    if params["extension"] == "World":
+        topology = layers["topology"]
+        return MapRenderer(topology.to_geodataframe(), borders = topology.borders())
+
+    topology = layers["topology_miller"]
+    bbox     = project_bbox(params["bounds"])
+    return MapRenderer(clip_to_bbox(topology.to_geodataframe(bbox.bounds), bbox),
+                       borders = topology.borders(bbox.bounds))
+
+
+def map_boundaries(params, data, lod_loader = None, geometry_cache = None):
+    """Returns the (clipped and projected) boundaries to draw."""
+    return map_renderer(params, data, lod_loader, geometry_cache).boundaries
+
+
+def color_map(params):
+    """Returns the colormap of the request and, in delta mode, the label-to-color mapping."""
+    if not params["delta"]:
+        return colors.LinearSegmentedColormap.from_list("default_cmap", params["colors"]), None
+
+    bin_labels  = delta_bin_labels(params["bins"])
+    value2color = dict(zip(bin_labels, params["colors"]))
+    colors_list = [value2color[value] for value in bin_labels]
+    return colors.ListedColormap(colors_list), value2color
+
+
+def map_data(params, boundaries4map, filtered_roli):
+    """Merges the scores into the boundaries and sets the opacity of each country."""
+    target_variable = params["variable"]
+    highlighted     = params["highlighted"] or []
+
+    # Keeping one score per country so the rows stay aligned with the boundaries
+    data4drawing = boundaries4map.merge(
+        filtered_roli.drop_duplicates(subset = "code", keep = "last"),
+        left_on  = "WB_A3", 
+        right_on = "code",
+        how      = "left"
+    )
+    
+    if params["opacity"]:
+        data4drawing["alpha"] = np.where(data4drawing["WB_A3"].isin(highlighted), 1, 0.2)
+    else:
+        data4drawing["alpha"] = 1
+
+    if params["opacity"] and params["delta"]:
+        data4drawing.loc[~data4drawing["WB_A3"].isin(highlighted), target_variable] = np.nan
+
+    return data4drawing
+
+
+def draw_map(params, data4drawing, renderer, cmap, value2color):
+    """
+    Recolors the renderer with the scores of the request and returns its figure. The
+    caller must hold `renderer.lock` until the figure has been saved.
+    """
+    legend = {}
+    if params["color_bar"] and not params["delta"]:
+        legend = {
+            "cmap" : cmap,
+            "norm" : colors.Normalize(vmin = params["floor"], vmax = params["ceiling"])
+        }
+    elif params["color_bar"]:
+        categories = dict(value2color)
+        if data4drawing[params["variable"]].isna().any():
+            categories["Missing values"] = MISSING_COLOR
+        legend = {"categories": categories}
+
+    return renderer.draw(
+        panel_colors(params, data4drawing, cmap, value2color),
+        width_in  = params["width_in"],
+        height_in = params["height_in"],
+        dpi       = params["dpi"],
+        linewidth = params["linewidth"],
+        **legend
+    )
+
+
+def outcome_table(params, data4drawing, roli_data, cmap, value2color):
+    """Builds the table with the scores and color codes by country."""
+    target_variable = params["variable"]
+    target_year     = params["year"]
+
+    outcome_table = (
+        pd.DataFrame(data4drawing.drop(columns = "geometry"))
+    )     
+    outcome_table = outcome_table[outcome_table["year"] == target_year]
+
+    if not params["delta"]:
+        outcome_table = (
+            outcome_table[["country", "WB_A3", target_variable]]
+            .sort_values(by = "country", ascending = True)
+        )
+        outcome_table["color_code"] = score_hex_codes(
+            outcome_table[target_variable], cmap, params["floor"], params["ceiling"]
+        )
+        
+    else:
+        outcome_table = (
+            outcome_table[["country", "WB_A3", target_variable, "score"]]
+            .sort_values(by = "country", ascending = True)
+        )
+        original_scores = roli_data[roli_data["year"] == target_year][["country", "code", target_variable]]
+        outcome_table = outcome_table.merge(
+            original_scores[["country", "code", target_variable]],
+            left_on="WB_A3", right_on="code",
+            suffixes=("_pct_change", "_original")
+        )
+                    
+        outcome_table["change"] = outcome_table["score"]
+        outcome_table["score"] = outcome_table[f"{target_variable}_original"]
+        outcome_table  = outcome_table.rename(
+            columns={
+                "country_pct_change": "country",
+                f"{target_variable}_pct_change": target_variable
+            }
+        )
+        outcome_table = outcome_table.drop(
+            columns = ["country_original", f"{target_variable}_original", "code"]
+        )
+        outcome_table["color_code"] = (
+            outcome_table[target_variable]
+            .map(value2color)
+        )
+
+    if params["highlighted"] is not None and params["extension"] != "World":
+        outcome_table = outcome_table[outcome_table["WB_A3"].isin(params["highlighted"])]
+
+    if params["delta"]:
+        outcome_table = outcome_table.drop(columns=[target_variable])
+        outcome_table["score"] = outcome_table["score"]*100
+        outcome_table["change"] = outcome_table["change"]*100
+
+    return outcome_table
+
+
+def draw_chart(params, outcome_table):
+    """Draws the bar chart with the scores (or changes) by country and returns its figure."""
+    if not params["delta"]:
+        chart_data = outcome_table
+        values     = chart_data[params["variable"]]
+    else:
+        chart_data = (
+            outcome_table
+            .dropna(subset = ["change", "color_code"])
+            .sort_values("change", ascending = False)
+        )
+        values     = chart_data["change"]
+
+    # Figures built outside pyplot can be drawn from download threads and are freed
+    # as soon as they are dropped
+    h = len(chart_data)/5
+    bars = Figure(figsize = (10, h))
+    ax   = bars.subplots()
+    ax.barh(
+        chart_data["country"],
+        values, 
+        color = chart_data["color_code"]
+    )
+    ax.invert_yaxis()
+    ax.margins(y = 0)
+    ax.set_title("Scores by Country")
+    return bars
+
+
+def panel_colors(params, data4drawing, cmap, value2color):
+    """Returns the RGBA face color of each geometry of a map panel."""
+    if not params["delta"]:
+        return score_colors(
+            data4drawing[params["variable"]], cmap, params["floor"], params["ceiling"],
+            alpha = data4drawing["alpha"]
+        )
+
+    categories = data4drawing[params["variable"]].astype(object)
+    return colors.to_rgba_array(
+        categories.map(value2color).fillna(MISSING_COLOR).tolist()
+    )
+
+
+def render_year_grid(params, data, years, ncols = None, lod_loader = None, geometry_cache = None,
+                     formats = ("png", "svg"), timer = NULL_TIMER):
+    """
+    Draws one map panel per year in a single figure. The boundaries are clipped,
+    projected and converted to matplotlib paths once, and every panel reuses the same
+    paths with its own face colors. Returns the grid rendered once per format, keyed
+    as `grid_<format>`.
+    """
+    if not years:
+        raise ValueError("The grid needs at least one year to draw.")
+
+    with timer.stage("boundaries"):
+        renderer       = map_renderer(params, data, lod_loader, geometry_cache)
+        boundaries4map = renderer.boundaries
+        paths          = renderer.paths
+    cmap, value2color = color_map(params)
+
+    with timer.stage("draw panels"):
+        ncols = ncols or int(np.ceil(np.sqrt(len(years))))
+        nrows = int(np.ceil(len(years) / ncols))
+        fig  = Figure(figsize = (params["width_in"], params["height_in"]), dpi = params["dpi"])
+        axes = fig.subplots(nrows, ncols, squeeze = False)
+
+        for ax, year in zip(axes.flat, years):
+            year_params  = dict(params, year = year)
+            data4drawing = map_data(year_params, boundaries4map, filter_scores(year_params, data))
+            ax.add_collection(
+                PathCollection(
+                    paths,
+                    facecolors = panel_colors(year_params, data4drawing, cmap, value2color),
+                    edgecolors = EDGE_COLOR if renderer.borders is None else "none",
+                    linewidths = params["linewidth"] if renderer.borders is None else 0,
+                    transform  = ax.transData
+                ),
+                autolim = False
+            )
+            if renderer.borders is not None:
+                ax.add_collection(
+                    LineCollection(
+                        renderer.borders,
+                        colors     = EDGE_COLOR,
+                        linewidths = params["linewidth"],
+                        transform  = ax.transData
+                    ),
+                    autolim = False
+                )
+            set_map_aspect(ax, boundaries4map)
+            ax.set_title(str(year))
+
+        for ax in axes.flat:
+            ax.axis("off")
+
+        if params["color_bar"] and not params["delta"]:
+            fig.colorbar(
+                cm.ScalarMappable(
+                    norm = colors.Normalize(vmin = params["floor"], vmax = params["ceiling"]),
+                    cmap = cmap
+                ),
+                ax = axes.ravel().tolist()
+            )
+
+    exports = timed_exports(fig, formats, "grid", timer, quantize = params["quantize_svg"])
+    return {f"grid_{fmt}": content for fmt, content in exports.items()}
+
+
+def export_name(output, fmt):
+    """Returns the key of an exported output, e.g. `map_svg` or `table_xlsx`."""
+    return f"{output}_{fmt}"
+
+
+def timed_exports(fig, formats, output, timer, **kwargs):
+    """Saves a figure once per format (see `figure_exports`), timing every format."""
+    exports = {}
+    for fmt in formats:
+        with timer.stage(f"save {output} {fmt}"):
+            exports.update(figure_exports(fig, [fmt], close = False, **kwargs))
+    return exports
+
+
+def prepare_request(params, data, lod_loader = None, geometry_cache = None, timer = NULL_TIMER):
+    """Returns the renderer, the data to draw and the colors of a map request."""
+    with timer.stage("filter scores"):
+        filtered_roli = filter_scores(params, data)
+    with timer.stage("boundaries"):
+        renderer      = map_renderer(params, data, lod_loader, geometry_cache)
+    with timer.stage("merge"):
+        data4drawing  = map_data(params, renderer.boundaries, filtered_roli)
+    cmap, value2color = color_map(params)
+    return renderer, data4drawing, cmap, value2color
+
+
+def render_outputs(params, data, lod_loader = None, geometry_cache = None,
+                   exports = ("map_svg", "table_xlsx", "chart_svg"), timer = NULL_TIMER):
+    """
+    Runs the whole pipeline for a map request and returns the previews (map and chart
+    PNG, outcome table) plus the requested `exports` (e.g. "map_svg", "map_svgz",
+    "chart_svg", "table_xlsx"). Each figure is drawn once and saved once per format.
+    The stages are recorded by `timer` (see `profiling.StageTimer`).
+    """
+    formats = {"map": ["png"], "chart": ["png"], "table": []}
+    for name in exports:
+        output, fmt = name.split("_")
+        if fmt not in formats[output]:
+            formats[output].append(fmt)
+
+    renderer, data4drawing, cmap, value2color = prepare_request(params, data, lod_loader, 
+                                                                geometry_cache, timer)
+    outputs = {}
+    with renderer.lock:
+        with timer.stage("draw map"):
+            fig = draw_map(params, data4drawing, renderer, cmap, value2color)
+        # The renderer keeps its figure for the next request
+        map_exports = timed_exports(fig, formats["map"], "map", timer, 
+                                    quantize = params["quantize_svg"])
+        for fmt, content in map_exports.items():
+            outputs[export_name("map", fmt)] = content
+
+    with timer.stage("table"):
+        table = outcome_table(params, data4drawing, data["roli"], cmap, value2color)
+    outputs["table"] = table
+    if "xlsx" in formats["table"]:
+        with timer.stage("save table xlsx"):
+            outputs["table_xlsx"] = table_xlsx(table)
+
+    with timer.stage("draw chart"):
+        chart = draw_chart(params, table)
+    chart_exports = timed_exports(chart, formats["chart"], "chart", timer, 
+                                  quantize = params["quantize_svg"])
+    for fmt, content in chart_exports.items():
+        outputs[export_name("chart", fmt)] = content
+
+    return outputs
@@ -0,0 +1,68 @@
+"""
+Score helpers for the yearly percentage-change (delta) mode.
+
+The percentage change between any two years is precomputed once per dataset as a
+cube indexed by base year, target year, country and variable, so that a map request
+only needs to slice it.
+"""
+
+import numpy as np
+import pandas as pd
+
+ID_COLUMNS = ["country", "code", "year", "region"]
+
+
+def build_change_cube(roli_data):
+    """
+    Builds the percentage-change cube of every numeric variable for every pair of
+    years. `changes[b, t, c, v]` holds the change of variable `v` for country `c`
+    between the years at positions `b` (base) and `t` (target).
+    """
+    variables = roli_data.select_dtypes(np.number).columns.tolist()
+    years     = sorted(roli_data["year"].unique().tolist())
+    codes     = sorted(roli_data["code"].unique().tolist())
+
+    values = (
+        roli_data
+        .set_index(["year", "code"])[variables]
+        .reindex(pd.MultiIndex.from_product([years, codes]))
+        .to_numpy(dtype = float)
+        .reshape(len(years), len(codes), len(variables))
+    )
+
+    # Same formula as DataFrame.pct_change(): target / base - 1
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        changes = values[np.newaxis, :, :, :] / values[:, np.newaxis, :, :] - 1
+
+    return {
+        "years"     : {year: i for i, year in enumerate(years)},
+        "codes"     : codes,
+        "variables" : variables,
+        "changes"   : changes,
+        "ids"       : {
+            year: group[ID_COLUMNS].reset_index(drop = True) 
+            for year, group in roli_data.groupby("year")
+        }
+    }
+
+
+def lookup_changes(cube, base_year, target_year):
+    """
+    Returns the percentage changes between two years for the countries with scores in
+    the target year. When `base_year` is None, the previous available year is used.
+    """
+    years = list(cube["years"])
+    if base_year is None:
+        base_year = years[max(cube["years"][target_year] - 1, 0)]
+
+    changes = pd.DataFrame(
+        cube["changes"][cube["years"][base_year], cube["years"][target_year]],
+        index   = cube["codes"],
+        columns = cube["variables"]
+    )
+    return (
+        cube["ids"][target_year]
+        .merge(changes, left_on = "code", right_index = True, how = "left")
+        .sort_values("country")
+        .reset_index(drop = True)
+    )
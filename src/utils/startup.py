@@ -0,0 +1,126 @@
+"""
+Startup of the app: deferred imports, pre-warming and the startup report.
+
+The login page only needs Streamlit, so app.py imports the data stack (pandas,
+geopandas, shapely, matplotlib and the rendering pipeline) and loads the master data
+only once the password was checked. Streamlit does not run any code before the first
+page load of a server process, so `prewarm` starts both in a background thread from
+the login page instead: the data is usually ready by the time the password is typed.
+It runs once per process and can be turned off with ROLI_PREWARM=0, e.g. to keep the
+memory of idle servers low.
+
+The time taken by every import and by the data loads is collected in
+`startup_report`, shown in the app and written to the profiling log (see
+profiling.py).
+"""
+
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+import streamlit as st
+
+PREWARM  = os.environ.get("ROLI_PREWARM", "1") != "0"
+DATA_DIR = "Data"
+
+# Modules imported after the login, in import order
+HEAVY_MODULES = [
+    "pandas",
+    "shapely",
+    "geopandas",
+    "matplotlib.pyplot",
+    "src.utils.rendering",
+    "src.utils.custom_data",
+    "src.utils.batch_render",
+    "src.utils.tiles",
+    "src.utils.web_map"
+]
+
+_report = {
+    "imports"  : {},
+    "loads"    : {},
+    "prewarm"  : None
+}
+_prewarm_lock   = threading.Lock()
+_prewarm_thread = None
+
+
+def import_modules(modules = HEAVY_MODULES):
+    """
+    Imports `modules` and records the time taken by the ones that were not imported
+    yet (dependencies shared with an earlier module are counted for that module).
+    """
+    for name in modules:
+        if name in sys.modules:
+            continue
+        start = time.perf_counter()
+        importlib.import_module(name)
+        _report["imports"].setdefault(name, time.perf_counter() - start)
+
+
+# The master data is shared by every session without copies, so it is read-only.
+# The boundaries are kept as shared arcs when their TopoJSON topology is available
+# (see src/utils/topology.py), so only the countries on the map are materialized.
+# The loaders take no arguments: st.cache_resource keys on the arguments as passed,
+# so the pre-warm and the app must call them the same way to share one copy
+@st.cache_resource
+def shared_master_data():
+    from src.utils.caching import freeze
+    from src.utils.rendering import load_master_data
+
+    start = time.perf_counter()
+    data  = freeze(load_master_data(DATA_DIR, topology = True))
+    _report["loads"]["master data"] = time.perf_counter() - start
+    return data
+
+
+# Mexican states layer, shared and read-only like the master data. It is only offered
+# once its boundaries were built with src/utils/states_boundaries.py
+@st.cache_resource
+def shared_states_data():
+    from src.utils.caching import freeze
+    from src.utils.data_loading import STATES_STEM, boundary_files
+    from src.utils.rendering import load_states_data
+
+    if not any(os.path.exists(os.path.join(DATA_DIR, file)) for file in boundary_files(STATES_STEM)):
+        return None
+    start = time.perf_counter()
+    data  = freeze(load_states_data(DATA_DIR))
+    _report["loads"]["Mexican states"] = time.perf_counter() - start
+    return data
+
+
+def _prewarm():
+    start = time.perf_counter()
+    try:
+        import_modules()
+        shared_master_data()
+    except Exception as error:
+        # The app loads the data again after the login and shows the error there
+        _report["prewarm"] = {"error": repr(error)}
+    else:
+        _report["prewarm"] = {"seconds": time.perf_counter() - start}
+
+    from src.utils.profiling import logger
+    logger.info(json.dumps({"name": "startup", **startup_report()}))
+
+
+def prewarm():
+    """Imports the data stack and loads the master data in the background, once per process."""
+    global _prewarm_thread
+    with _prewarm_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(target = _prewarm, name = "prewarm", daemon = True)
+            _prewarm_thread.start()
+
+
+def startup_report():
+    """Returns the import and load times of the process, in seconds."""
+    return {
+        "imports" : dict(_report["imports"]),
+        "loads"   : dict(_report["loads"]),
+        "prewarm" : _report["prewarm"]
+    }
@@ -0,0 +1,77 @@
+"""
+Builds the boundaries of the Mexican states layer from an admin-1 boundary dataset.
+
+The repository does not ship state geometries. Any admin-1 dataset with ISO 3166-2
+codes can be used, such as Natural Earth's "Admin 1 - States, Provinces"
+(https://www.naturalearthdata.com/downloads/10m-cultural-vectors/), whose
+`iso_3166_2` and `name` fields are read by default. The states of Mexico are kept,
+their codes are matched against the ones of MSI_data.csv, and the layer is written
+as Data/MX_states.geojson together with its GeoParquet store (see
+`data_loading.write_boundary_store`).
+
+Usage:
+    python -m src.utils.states_boundaries ne_10m_admin_1_states_provinces.shp [--data-dir Data]
+"""
+
+import argparse
+import os
+
+import geopandas as gpd
+
+from src.utils.data_loading import (
+    path2data, STATES_STEM, boundary_files, write_boundary_store, load_msi
+)
+
+# Older releases of the ISO 3166-2 list (and of Natural Earth) code Mexico City as MX-DIF
+STATE_ID_ALIASES = {"MX-DIF": "MX-CMX"}
+
+
+def build_states_boundaries(source, data_dir = path2data, id_column = "iso_3166_2",
+                            name_column = "name"):
+    """
+    Extracts the Mexican states from an admin-1 dataset and writes the states layer.
+    Returns the boundaries and the MSI state codes that have no boundary.
+    """
+    raw_states = gpd.read_file(source)
+    state_ids  = raw_states[id_column].astype(str).str.upper().replace(STATE_ID_ALIASES)
+
+    states = gpd.GeoDataFrame(
+        {
+            "State_Id" : state_ids,
+            "State"    : raw_states[name_column]
+        },
+        geometry = raw_states.geometry.values,
+        crs      = raw_states.crs
+    )
+    states = (
+        states[states["State_Id"].str.startswith("MX-")]
+        .to_crs("EPSG:4326")
+        .dissolve(by = "State_Id", aggfunc = "first")
+        .reset_index()
+    )
+
+    geojson_file, _, _ = boundary_files(STATES_STEM)
+    states.to_file(os.path.join(data_dir, geojson_file), driver = "GeoJSON")
+    write_boundary_store(states, data_dir, stem = STATES_STEM)
+
+    missing = sorted(set(load_msi(data_dir)["State_Id"]) - set(states["State_Id"]))
+    return states, missing
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Build the boundaries of the Mexican states layer.")
+    parser.add_argument("source", help = "Admin-1 boundaries (any format read by geopandas)")
+    parser.add_argument("--data-dir", default = path2data)
+    parser.add_argument("--id-column", default = "iso_3166_2")
+    parser.add_argument("--name-column", default = "name")
+    args = parser.parse_args(argv)
+
+    states, missing = build_states_boundaries(args.source, args.data_dir,
+                                              args.id_column, args.name_column)
+    print(f"Wrote {len(states)} states to {os.path.abspath(args.data_dir)}")
+    if missing:
+        print(f"No boundary for the MSI states: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Pre-built vector tiles for the interactive web map.
+
+The world is cut into square longitude/latitude tiles: zoom level `z` has 2^z columns
+of 360/2^z degrees. Every tile holds the boundaries intersecting it, clipped to the
+tile (plus a small margin, so borders do not show at the seams) and simplified with
+the coarsest level of detail that still looks exact at 256 pixels per tile.
+Coordinates are quantized to an integer grid of `TILE_EXTENT` units per tile side.
+
+Tiles are JSON files written under `static/tiles/{z}/{x}/{y}.json`, next to a
+manifest listing them and the checksum of the boundaries they were cut from, so that
+they are rebuilt once the boundaries change. Streamlit serves that folder as static files, so the web map
+works offline: the browser fetches the tiles from the app itself, caches them, and
+colors them from the per-country scores sent with each request.
+
+Usage:
+    python -m src.utils.tiles [--data-dir Data] [--max-zoom 4]
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import shapely
+
+from src.utils.data_loading import (
+    path2data, boundaries_checksum, load_boundaries, load_lod_manifest, load_lod_layer
+)
+from src.utils.geometry import select_lod
+
+# Streamlit serves the files in ./static at app/static when static serving is enabled
+path2tiles    = os.path.join(os.path.dirname(__file__), "..", "..", "static", "tiles")
+TILE_URL      = "app/static/tiles"
+TILE_MANIFEST = "manifest.json"
+TILE_PIXELS   = 256
+TILE_EXTENT   = 4096
+TILE_BUFFER   = 64
+MAX_ZOOM      = 4
+
+
+def tile_size(z):
+    """Returns the side of the tiles of zoom level `z`, in degrees."""
+    return 360 / 2**z
+
+
+def tile_grid(z):
+    """Returns the number of columns and rows of zoom level `z`."""
+    return 2**z, max(1, 2**z // 2)
+
+
+def tile_bounds(z, x, y):
+    """Returns the (min_lon, min_lat, max_lon, max_lat) extent of a tile. Rows start at 90N."""
+    size  = tile_size(z)
+    min_X = -180 + x * size
+    max_Y = 90 - y * size
+    return (min_X, max_Y - size, min_X + size, max_Y)
+
+
+def encode_tile(boundaries, z, x, y):
+    """
+    Clips the boundaries to a tile and returns its features, each one with the country
+    code and a list of rings as flat [x0, y0, x1, y1, ...] integer arrays. Vertices
+    falling on the same grid cell as the previous one are dropped.
+    """
+    min_X, min_Y, max_X, max_Y = tile_bounds(z, x, y)
+    size   = tile_size(z)
+    margin = size * TILE_BUFFER / TILE_EXTENT
+
+    hits = boundaries.sindex.query(
+        shapely.box(min_X - margin, min_Y - margin, max_X + margin, max_Y + margin),
+        predicate = "intersects"
+    )
+    clipped = shapely.clip_by_rect(
+        boundaries.geometry.values[hits],
+        min_X - margin, min_Y - margin, max_X + margin, max_Y + margin
+    )
+
+    features = []
+    for code, geom in zip(boundaries["WB_A3"].values[hits], clipped):
+        rings = []
+        for ring in shapely.get_rings(shapely.get_parts(geom)):
+            coords = shapely.get_coordinates(ring)
+            cells  = np.column_stack([
+                np.round((coords[:, 0] - min_X) / size * TILE_EXTENT),
+                np.round((max_Y - coords[:, 1]) / size * TILE_EXTENT)
+            ]).astype(int)
+            keep = np.r_[True, np.any(cells[1:] != cells[:-1], axis = 1)]
+            if keep.sum() > 3:
+                rings.append(cells[keep].ravel().tolist())
+        if rings:
+            features.append({"id": code, "rings": rings})
+
+    return features
+
+
+def build_tiles(boundaries, levels = (), data_dir = path2data, tile_dir = path2tiles,
+                max_zoom = MAX_ZOOM):
+    """
+    Writes the tiles of every zoom level up to `max_zoom` and their manifest. Each zoom
+    level uses the coarsest simplification level of the LOD store (see
+    `data_loading.write_lod_store`) that is fine enough for it. Returns the manifest.
+    """
+    if os.path.isdir(tile_dir):
+        shutil.rmtree(tile_dir)
+
+    layers   = {None: boundaries}
+    manifest = {
+        "source_sha256" : boundaries_checksum(data_dir),
+        "max_zoom"      : max_zoom,
+        "extent"        : TILE_EXTENT,
+        "buffer"        : TILE_BUFFER,
+        "pixels"        : TILE_PIXELS,
+        "tiles"         : {}
+    }
+    for z in range(max_zoom + 1):
+        lod  = select_lod(levels, tile_bounds(z, 0, 0), TILE_PIXELS, TILE_PIXELS, 1)
+        name = lod["name"] if lod else None
+        if name not in layers:
+            layers[name] = load_lod_layer(lod, data_dir)
+
+        available = []
+        ncols, nrows = tile_grid(z)
+        for x in range(ncols):
+            for y in range(nrows):
+                features = encode_tile(layers[name], z, x, y)
+                if not features:
+                    continue
+                os.makedirs(os.path.join(tile_dir, str(z), str(x)), exist_ok = True)
+                with open(os.path.join(tile_dir, str(z), str(x), f"{y}.json"), "w") as f:
+                    json.dump({"features": features}, f, separators = (",", ":"))
+                available.append([x, y])
+
+        manifest["tiles"][str(z)] = available
+
+    with open(os.path.join(tile_dir, TILE_MANIFEST), "w") as f:
+        json.dump(manifest, f, separators = (",", ":"))
+
+    return manifest
+
+
+def load_tile_manifest(tile_dir = path2tiles, data_dir = path2data):
+    """
+    Returns the manifest of the pre-built tiles, or None when they were not built or
+    were cut from other boundaries than the current ones.
+    """
+    manifest_path = os.path.join(tile_dir, TILE_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("source_sha256") != boundaries_checksum(data_dir):
+        return None
+    return manifest
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Build the vector tiles of the web map.")
+    parser.add_argument("--data-dir", default = path2data)
+    parser.add_argument("--tile-dir", default = path2tiles)
+    parser.add_argument("--max-zoom", type = int, default = MAX_ZOOM)
+    args = parser.parse_args(argv)
+
+    manifest = build_tiles(load_boundaries(args.data_dir), load_lod_manifest(args.data_dir),
+                           args.data_dir, args.tile_dir, args.max_zoom)
+    print(f"Wrote {sum(len(tiles) for tiles in manifest['tiles'].values())} tiles "
+          f"(zoom 0-{args.max_zoom}) to {os.path.abspath(args.tile_dir)}")
+
+
+if __name__ == "__main__":
+    main()
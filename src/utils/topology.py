@@ -0,0 +1,178 @@
+"""
+Shared-arc (TopoJSON) storage for the boundaries.
+
+In the GeoJSON and GeoParquet stores every country keeps its full rings, so each
+border shared by two countries is stored twice. The topology written by
+boundary_simplification.py stores every border once, as an "arc", and each country
+as lists of arc indices. `Topology` keeps that structure in memory as two numpy
+arrays (all the arc vertices and the offset of each arc) and only builds shapely
+geometries for the countries of the current map extension.
+
+The arcs also give the borders of a map directly: drawing each arc used by the
+countries on the map once gives cleaner outlines than stroking both sides of every
+shared border.
+"""
+
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+
+def _decode_arcs(arcs, transform = None):
+    """Returns the vertices of all the arcs in one (n, 2) array and the offset of each arc."""
+    lengths = np.array([len(arc) for arc in arcs])
+    offsets = np.r_[0, np.cumsum(lengths)]
+    coords  = np.array([point[:2] for arc in arcs for point in arc], dtype = float).reshape(-1, 2)
+
+    if transform is not None:
+        # Quantized topologies store the arcs as deltas from the previous vertex
+        starts = np.repeat(offsets[:-1], lengths)
+        totals = np.cumsum(coords, axis = 0)
+        coords = totals - np.vstack([np.zeros((1, 2)), totals])[starts]
+        coords = coords * transform["scale"] + transform["translate"]
+
+    return coords, offsets
+
+
+class Topology:
+    """
+    Countries stored as lists of shared arcs. `attributes` holds the properties of each
+    country (one row per geometry) and `polygons[i]` its polygons, each one a list of
+    rings given as arc indices (a negative index `~j` is arc `j` reversed).
+    """
+
+    def __init__(self, arc_coords, arc_offsets, polygons, attributes, crs = "EPSG:4326"):
+        self.arc_coords  = arc_coords
+        self.arc_offsets = arc_offsets
+        self.polygons    = polygons
+        self.attributes  = attributes
+        self.crs         = crs
+
+        # Bounds of every arc, and of every country from the arcs it uses
+        starts = arc_offsets[:-1]
+        self.arc_bounds = np.column_stack([
+            np.minimum.reduceat(arc_coords, starts, axis = 0),
+            np.maximum.reduceat(arc_coords, starts, axis = 0)
+        ])
+        self.bounds = np.array([
+            self._arc_set_bounds(self.geometry_arcs([i])) for i in range(len(polygons))
+        ])
+
+    @classmethod
+    def from_json(cls, topology, object_name = None):
+        """Builds a topology from a parsed TopoJSON document."""
+        name = object_name or next(iter(topology["objects"]))
+        geometries = topology["objects"][name]["geometries"]
+        arc_coords, arc_offsets = _decode_arcs(topology["arcs"], topology.get("transform"))
+
+        # Polygons are kept as [polygon][ring][arc] for both geometry types
+        polygons = []
+        for geometry in geometries:
+            if geometry["type"] == "Polygon":
+                polygons.append([geometry["arcs"]])
+            elif geometry["type"] == "MultiPolygon":
+                polygons.append(geometry["arcs"])
+            else:
+                polygons.append([])
+
+        attributes = pd.DataFrame([geometry.get("properties", {}) for geometry in geometries])
+        return cls(arc_coords, arc_offsets, polygons, attributes)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the arcs and the geometry index."""
+        n_refs = sum(len(ring) for polygons in self.polygons for rings in polygons for ring in rings)
+        return (self.arc_coords.nbytes + self.arc_offsets.nbytes + self.arc_bounds.nbytes
+                + self.bounds.nbytes + 8 * n_refs)
+
+    def arc(self, index):
+        """Returns the vertices of an arc, reversed for negative indices."""
+        if index < 0:
+            index = ~index
+            return self.arc_coords[self.arc_offsets[index]:self.arc_offsets[index + 1]][::-1]
+        return self.arc_coords[self.arc_offsets[index]:self.arc_offsets[index + 1]]
+
+    def ring_coords(self, ring):
+        """Stitches the arcs of a ring, dropping the vertex repeated where two arcs meet."""
+        return np.concatenate([
+            self.arc(index) if i == 0 else self.arc(index)[1:] for i, index in enumerate(ring)
+        ])
+
+    def geometry(self, i):
+        """Materializes the (multi)polygon of country `i`."""
+        polygons = [
+            shapely.Polygon(self.ring_coords(rings[0]), [self.ring_coords(ring) for ring in rings[1:]])
+            for rings in self.polygons[i] if rings
+        ]
+        if not polygons:
+            return shapely.Polygon()
+        return polygons[0] if len(polygons) == 1 else shapely.MultiPolygon(polygons)
+
+    def geometry_arcs(self, indices):
+        """Returns the (non-negative) indices of the arcs used by the given countries."""
+        arcs = {
+            index if index >= 0 else ~index
+            for i in indices for rings in self.polygons[i] for ring in rings for index in ring
+        }
+        return np.array(sorted(arcs), dtype = int)
+
+    def _arc_set_bounds(self, arcs):
+        if not len(arcs):
+            return np.full(4, np.nan)
+        bounds = self.arc_bounds[arcs]
+        return np.r_[bounds[:, :2].min(axis = 0), bounds[:, 2:].max(axis = 0)]
+
+    def select(self, bbox = None):
+        """Returns the indices of the countries whose bounds intersect `bbox` (all by default)."""
+        if bbox is None:
+            return np.flatnonzero(~np.isnan(self.bounds[:, 0]))
+        min_X, min_Y, max_X, max_Y = bbox
+        return np.flatnonzero(
+            (self.bounds[:, 0] <= max_X) & (self.bounds[:, 2] >= min_X) &
+            (self.bounds[:, 1] <= max_Y) & (self.bounds[:, 3] >= min_Y)
+        )
+
+    def to_geodataframe(self, bbox = None):
+        """Materializes the countries intersecting `bbox` (or every country) as a GeoDataFrame."""
+        indices = self.select(bbox)
+        return gpd.GeoDataFrame(
+            self.attributes.iloc[indices].reset_index(drop = True),
+            geometry = [self.geometry(i) for i in indices],
+            crs      = self.crs
+        )
+
+    def borders(self, bbox = None):
+        """
+        Returns the vertices of every arc used by the countries intersecting `bbox`, each
+        shared border once. With a `bbox`, the arcs are clipped to it.
+        """
+        arcs = self.geometry_arcs(self.select(bbox))
+        if bbox is None:
+            return [self.arc(index) for index in arcs]
+        if not len(arcs):
+            return []
+
+        starts, ends = self.arc_offsets[arcs], self.arc_offsets[arcs + 1]
+        vertices = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        lines    = shapely.linestrings(self.arc_coords[vertices], 
+                                       indices = np.repeat(np.arange(len(arcs)), ends - starts))
+        clipped  = shapely.clip_by_rect(lines, *bbox)
+        parts    = shapely.get_parts(clipped[~shapely.is_empty(clipped)])
+        return [shapely.get_coordinates(part) for part in parts]
+
+    def to_crs(self, crs):
+        """Returns the same topology with its arcs projected to `crs`."""
+        transformer = Transformer.from_crs(self.crs, crs, always_xy = True)
+        x, y = transformer.transform(self.arc_coords[:, 0], self.arc_coords[:, 1])
+        return Topology(np.column_stack([x, y]), self.arc_offsets, self.polygons,
+                        self.attributes, crs)
+
+
+def load_topology(path, object_name = None):
+    """Reads a TopoJSON file (as written by the `topojson` package) into a `Topology`."""
+    with open(path) as f:
+        return Topology.from_json(json.load(f), object_name)
@@ -0,0 +1,71 @@
+"""
+Interactive web map drawn in the browser from the pre-built tiles (see `tiles.py`).
+
+The page only receives the color, tooltip and legend of each country for the
+current request, which weighs a few KB. The boundaries come from the tiles, which
+the browser fetches once from the app's static folder and keeps in its cache, so
+changing the variable or the year does not draw or send any image.
+"""
+
+import json
+import os
+
+import pandas as pd
+
+from src.utils.coloring import MISSING_COLOR, rgba2hex
+from src.utils.map_renderer import EDGE_COLOR
+from src.utils.rendering import filter_scores, map_data, color_map, panel_colors
+from src.utils.tiles import TILE_URL
+
+WEB_MAP_TEMPLATE = os.path.join(os.path.dirname(__file__), "web_map.html")
+WEB_MAP_HEIGHT   = 600
+
+
+def web_map_data(params, data, tile_url = TILE_URL, height = WEB_MAP_HEIGHT):
+    """Returns the colors, tooltips and legend of a map request for the web map."""
+    target_variable = params["variable"]
+    codes = pd.DataFrame({"WB_A3": data["boundaries"]["WB_A3"].unique()})
+    data4drawing = map_data(params, codes, filter_scores(params, data))
+    cmap, value2color = color_map(params)
+
+    fills = rgba2hex(panel_colors(params, data4drawing, cmap, value2color), alpha = True)
+
+    scored = data4drawing.dropna(subset = [target_variable])
+    if params["delta"]:
+        values = scored["score"].map(lambda change: f"{change * 100:+.1f}%")
+    else:
+        values = scored[target_variable].map(lambda score: f"{score:.2f}")
+
+    if not params["color_bar"]:
+        legend = {"type": None}
+    elif params["delta"]:
+        legend = {
+            "type"  : "categories",
+            "items" : list(value2color.items()) + [("Missing values", MISSING_COLOR)]
+        }
+    else:
+        legend = {
+            "type"    : "ramp",
+            "colors"  : params["colors"],
+            "floor"   : params["floor"],
+            "ceiling" : params["ceiling"]
+        }
+
+    return {
+        "colors"        : dict(zip(data4drawing["WB_A3"], fills.tolist())),
+        "labels"        : dict(zip(scored["WB_A3"], scored["country"] + ": " + values)),
+        "legend"        : legend,
+        "bounds"        : list(params["bounds"]),
+        "linewidth"     : params["linewidth"],
+        "edge_color"    : EDGE_COLOR,
+        "missing_color" : MISSING_COLOR,
+        "tile_url"      : tile_url,
+        "height"        : height
+    }
+
+
+def web_map_html(payload):
+    """Returns the self-contained page drawing the web map described by `web_map_data()`."""
+    with open(WEB_MAP_TEMPLATE) as f:
+        template = f.read()
+    return template.replace("__WEB_MAP_DATA__", json.dumps(payload, separators = (",", ":")))